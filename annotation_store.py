@@ -0,0 +1,111 @@
+import json
+import os
+
+import numpy as np
+
+LOG_FILE = "landmarks.jsonl"
+JSON_FILE = "landmarks.json"
+NPZ_FILE = "landmarks.npz"
+NUM_POINTS = 5
+
+
+# ========== Append-only log ==========
+def append_annotation(log_path, fname, points):
+    """Append one confirmed annotation as a JSON line and fsync it, so a crash loses nothing."""
+    record = json.dumps({"file": fname, "points": [[int(x), int(y)] for x, y in points]})
+    with open(log_path, 'a') as f:
+        f.write(record + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_log(log_path):
+    """Replay the log into {filename: points}. Later entries win; a torn last line is ignored."""
+    annotations = {}
+    if not os.path.exists(log_path):
+        return annotations
+    with open(log_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: skipping unreadable line in {log_path}")
+                continue
+            annotations[record["file"]] = record["points"]
+    return annotations
+
+
+# ========== Loading ==========
+def load_annotations(path):
+    """Load annotations from landmarks.json, a .jsonl log, or the compacted .npz.
+
+    Returns {filename: points}; points are lists for JSON sources and (5, 2)
+    arrays for .npz.
+    """
+    if path.endswith('.npz'):
+        names, points = load_arrays(path)
+        return dict(zip(names, points))
+    if path.endswith('.jsonl'):
+        return load_log(path)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def load_arrays(path):
+    """Load annotations as (names, points) arrays. Cheap for .npz; converts JSON sources."""
+    if path.endswith('.npz'):
+        data = np.load(path)
+        return data["names"].tolist(), data["points"]
+    annotations = load_annotations(path)
+    names = list(annotations.keys())
+    return names, to_points(annotations, names)
+
+def to_points(annotations, names):
+    """Stack the points of `names` into an (N, K, 2) float32 array; (0, 5, 2) when empty."""
+    if not names:
+        return np.zeros((0, NUM_POINTS, 2), dtype=np.float32)
+    return np.array([annotations[n] for n in names], dtype=np.float32).reshape(len(names), -1, 2)
+
+
+# ========== Compaction ==========
+def compact(log_path=LOG_FILE, json_path=JSON_FILE, npz_path=NPZ_FILE):
+    """Merge the existing landmarks.json and the log into landmarks.json and landmarks.npz.
+
+    The log is moved aside before it is read and archived as <log>.archived
+    once both files are written, so it doesn't grow forever and later
+    compactions don't replay old entries over corrections made in the JSON.
+    """
+    # Labeling can keep appending while we compact; new lines go to a fresh log.
+    pending = log_path + ".compacting"
+    if os.path.exists(log_path):
+        if os.path.exists(pending):  # left by an interrupted compaction
+            with open(log_path, 'r') as src, open(pending, 'a') as dst:
+                dst.write("\n" + src.read())
+            os.remove(log_path)
+        else:
+            os.replace(log_path, pending)
+
+    annotations = {}
+    if os.path.exists(json_path):
+        with open(json_path, 'r') as f:
+            annotations.update(json.load(f))
+    annotations.update(load_log(pending))
+
+    # Write to temp files then rename, so an interrupted compaction keeps the old files.
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(annotations, f, indent=4)
+    os.replace(tmp_path, json_path)
+
+    names = sorted(annotations)
+    tmp_path = npz_path + ".tmp"
+    with open(tmp_path, 'wb') as f:  # a file object stops np.savez from appending .npz
+        np.savez(f, names=np.array(names), points=to_points(annotations, names))
+    os.replace(tmp_path, npz_path)
+
+    if os.path.exists(pending):
+        os.replace(pending, log_path + ".archived")
+
+    print(f"Compacted {len(names)} annotations into {json_path} and {npz_path}")
+    return annotations
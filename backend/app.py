@@ -1,21 +1,55 @@
-from flask import Flask, request, jsonify, send_from_directory, Response
-from werkzeug.utils import secure_filename
+from flask import Flask, request, jsonify, send_from_directory, send_file
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename, send_from_directory as send_from_directory_x
 import subprocess, uuid, pathlib
+import math
+from urllib.parse import quote
 from flask_cors import CORS
-import tempfile, os
+import os
+from concurrent.futures import ThreadPoolExecutor
+from live_stream import register as register_live_stream
+from sessions import register as register_sessions
+from still_images import register as register_still_images
+from storage import StorageManager, scratch_dir
+from media import X264_ARGS, mux_audio, with_audio_from
+from profiling import child_env, register as register_profiling
+from scheduler import CoreScheduler
+from overlay_processor import parse_stats
+from deadline import DEFAULT_FACTOR
 
 # Set up file paths - need to handle uploads & processed videos
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent  # project root
 UPLOAD_DIR = BASE_DIR / "uploads"
 PROCESSED_DIR = BASE_DIR / "processed"
+PROFILE_DIR = BASE_DIR / "profiles"
 MASK_PATH = BASE_DIR / "masks" / "cat.png"  # Default mask
+# /process-inline keeps frames in planar YUV end to end; set to "bgr" for the
+# original WebM→MP4 / OpenCV / re-encode pipeline
+YUV_PIPELINE = os.environ.get("FACEFILTER_FRAME_PATH", "yuv") == "yuv"
+# Let the front proxy stream /processed files. Only /processed: responses
+# built from scratch dirs are deleted once sent, before a proxy could read them.
+# Apache/lighttpd: FACEFILTER_X_SENDFILE=1. nginx: FACEFILTER_X_ACCEL_PREFIX set to
+# an `internal` location aliased to processed/, e.g. /internal-processed/
+X_SENDFILE = os.environ.get("FACEFILTER_X_SENDFILE") == "1"
+X_ACCEL_PREFIX = os.environ.get("FACEFILTER_X_ACCEL_PREFIX")
 
 # Make sure dirs exist
 UPLOAD_DIR.mkdir(exist_ok=True)
 PROCESSED_DIR.mkdir(exist_ok=True)
 
+# Evicts old/oversized files from uploads/, processed/ and profiles/ in the background
+PROFILE_DIR.mkdir(exist_ok=True)
+storage = StorageManager([UPLOAD_DIR, PROCESSED_DIR, PROFILE_DIR]).start()
+# Splits the cores between concurrent processing jobs, so parallel requests
+# don't each start torch/OpenCV/ffmpeg thread pools sized to the whole machine
+scheduler = CoreScheduler()
+
 app = Flask(__name__, static_folder=None)
 CORS(app, resources={r"/*": {"origins": "*"}})
+register_live_stream(app)  # WebSocket /live: per-frame landmarks from a resident model
+register_sessions(app)  # /sessions: process chunks while the user is still recording
+register_still_images(app)  # /process-images: batched photo masking
+register_profiling(app, PROFILE_DIR)  # X-Profile: 1 / ?profile=1 / FACEFILTER_PROFILE=1, served at /profiles
 
 @app.route("/upload", methods=["POST"])
 def upload():
@@ -28,32 +62,75 @@ def upload():
     # Use UUIDs for filenames to avoid collisions
     in_name = secure_filename(f"{uuid.uuid4()}.webm")
     input_path = UPLOAD_DIR / in_name
-    video_file.save(input_path)
 
     # Output keeps same UUID but adds _mask and changes ext
     out_name = input_path.stem + "_mask.mp4"
     output_path = PROCESSED_DIR / out_name
+    muxed = output_path.with_suffix(".audio.mp4")
 
-    # Run processor in a separate process to avoid memory issues
-    cmd = [
-        "python",
-        str(BASE_DIR / "backend" / "overlay_processor.py"),
-        str(input_path),
-        str(MASK_PATH),
-        str(output_path)
-    ]
-    try:
-        subprocess.run(cmd, check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] overlay_processor failed:", e.stderr.decode())
-        return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
+    # The sweeper leaves these alone however long processing takes
+    with storage.in_use(input_path, output_path, muxed):
+        try:
+            video_file.save(input_path)
+            # Run processor in a separate process to avoid memory issues
+            with scheduler.job() as budget:
+                stats = run_overlay_processor(input_path, [(MASK_PATH, output_path)], budget=budget)
+            # OpenCV writes video only; stream-copy it and add the upload's audio
+            try:
+                mux_audio(output_path, input_path, muxed)
+                os.replace(muxed, output_path)
+            except subprocess.CalledProcessError as e:
+                print("[WARN] audio mux failed, serving video only", e.stderr.decode())
+                muxed.unlink(missing_ok=True)
+        except subprocess.CalledProcessError as e:
+            print("[ERROR] overlay_processor failed:", e.stderr.decode())
+            input_path.unlink(missing_ok=True)
+            output_path.unlink(missing_ok=True)
+            return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
+        except BaseException:
+            input_path.unlink(missing_ok=True)
+            output_path.unlink(missing_ok=True)
+            muxed.unlink(missing_ok=True)
+            raise
+        finally:
+            storage.notify_write()
 
-    return jsonify({"processed_url": f"/processed/{out_name}"})
+    return jsonify({"processed_url": f"/processed/{out_name}", "frame_stats": stats})
 
 @app.route("/processed/<path:fname>")
 def processed(fname):
-    """Serve processed video files."""
-    return send_from_directory(PROCESSED_DIR, fname, as_attachment=False)
+    """Serve processed video files.
+
+    send_from_directory answers Range and If-None-Match requests (206/304) and
+    streams the file via wsgi.file_wrapper, which servers like gunicorn turn
+    into sendfile(), so large outputs are not read through Python. Behind a
+    proxy, X-Accel-Redirect / X-Sendfile hand the file to the proxy instead.
+    """
+    if X_ACCEL_PREFIX:
+        path = safe_join(str(PROCESSED_DIR), fname)
+        if path is None or not os.path.isfile(path):
+            return jsonify({"error": "Not found"}), 404
+        resp = app.response_class(mimetype="video/mp4")
+        resp.headers["X-Accel-Redirect"] = X_ACCEL_PREFIX.rstrip("/") + "/" + quote(fname)
+        return resp
+    if X_SENDFILE:
+        # Per call rather than app.config["USE_X_SENDFILE"], which would also
+        # apply to the scratch-dir send_file()s
+        return send_from_directory_x(PROCESSED_DIR, fname, request.environ, use_x_sendfile=True,
+                                     response_class=app.response_class, conditional=True, etag=True,
+                                     max_age=3600)
+    return send_from_directory(PROCESSED_DIR, fname, as_attachment=False,
+                               conditional=True, etag=True, max_age=3600)
+
+@app.route("/storage", methods=["GET"])
+def storage_usage():
+    """Current disk usage of uploads/ + processed/ against the quotas."""
+    return jsonify(storage.usage())
+
+@app.route("/scheduler", methods=["GET"])
+def scheduler_status():
+    """Running jobs and the cores each may use."""
+    return jsonify(scheduler.status())
 
 @app.route("/process-inline", methods=["POST"])
 def process_inline():
@@ -70,95 +147,193 @@ def process_inline():
     if not mask_path.exists():
         return jsonify({"error": "Mask not found"}), 400
 
-    # Save uploaded webm to temp file
-    src_file = request.files["video"]
-    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp_in:
-        src_file.save(tmp_in)
-        input_path = tmp_in.name
-
-    # WebM → MP4 conversion (OpenCV needs MP4)
-    interm_fd, interm_mp4 = tempfile.mkstemp(suffix=".mp4")
-    os.close(interm_fd)
+    # Optional time budget as a multiple of the clip's length, e.g. deadline=2
     try:
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", input_path,
-            "-c:v", "libx264",
-            "-pix_fmt", "yuv420p",
-            "-preset", "veryfast",
-            "-movflags", "+faststart",
-            interm_mp4,
-        ], check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        os.unlink(input_path)
-        os.unlink(interm_mp4)
-        return jsonify({"error": "Failed to convert WebM", "details": e.stderr.decode()}), 500
-
-    # Create temp file for processed output
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp_out:
-        output_path = tmp_out.name
-
-    # Call overlay processor to apply mask
+        deadline = float(request.form.get("deadline") or DEFAULT_FACTOR or 0)
+    except ValueError:
+        return jsonify({"error": "Invalid deadline"}), 400
+    if not math.isfinite(deadline) or deadline < 0:  # float() accepts "nan" and "inf"
+        return jsonify({"error": "Invalid deadline"}), 400
+
+    # All intermediates live in one scratch dir that is removed on every exit
+    # path, or once the response has been sent
+    with scratch_dir() as scratch, scheduler.job() as budget:
+        # Save uploaded webm to temp file
+        input_path = scratch.path("input.webm")
+        request.files["video"].save(input_path)
+
+        if YUV_PIPELINE:
+            # Planar YUV path: decode → mask → final H.264 (+ audio) in one process
+            final_mp4 = scratch.path("final.mp4")
+            extra_args = ["--yuv", "--audio", str(input_path)]
+            if deadline:
+                extra_args += ["--deadline", str(deadline)]
+            try:
+                stats = run_overlay_processor(input_path, [(mask_path, final_mp4)], extra_args, budget=budget)
+            except subprocess.CalledProcessError as e:
+                return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
+            resp = send_file(final_mp4, mimetype="video/mp4", download_name="processed.mp4")
+            add_stats_headers(resp, stats)
+            return scratch.hand_off(resp)
+
+        # WebM → MP4 conversion (OpenCV needs MP4)
+        interm_mp4 = scratch.path("interm.mp4")
+        try:
+            convert_to_mp4(input_path, interm_mp4, budget)
+        except subprocess.CalledProcessError as e:
+            return jsonify({"error": "Failed to convert WebM", "details": e.stderr.decode()}), 500
+
+        # Call overlay processor to apply mask
+        output_path = scratch.path("overlay.mp4")
+        try:
+            stats = run_overlay_processor(interm_mp4, [(mask_path, output_path)], budget=budget)
+        except subprocess.CalledProcessError as e:
+            return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
+
+        final_mp4 = scratch.path("final.mp4")
+        try:
+            finalize_mp4(output_path, input_path, final_mp4, budget)
+        except subprocess.CalledProcessError as e:
+            # Fallback to unprocessed file if ffmpeg fails
+            print("[WARN] ffmpeg transcode failed, serving raw output", e.stderr.decode())
+            final_mp4 = output_path
+
+        # Stream the file instead of loading it into memory
+        resp = send_file(final_mp4, mimetype="video/mp4", download_name="processed.mp4")
+        add_stats_headers(resp, stats)
+        print("[DEBUG] returning", final_mp4.stat().st_size, "bytes from process-inline")
+        return scratch.hand_off(resp)
+
+@app.route("/process-multi", methods=["POST"])
+def process_multi():
+    """Render one recording with several masks from a single decode + landmark pass.
+
+    Form fields: `video`, and `masks` as a comma-separated list (or repeated
+    `mask` fields). Returns a manifest of /processed URLs, one per mask.
+    """
+    if "video" not in request.files:
+        return jsonify({"error": "No video field in form"}), 400
+
+    mask_names = [m for m in request.form.get("masks", "").split(",") if m] or request.form.getlist("mask")
+    mask_names = list(dict.fromkeys(mask_names))  # drop duplicates, keep order
+    if not mask_names:
+        return jsonify({"error": "No masks requested"}), 400
+    for name in mask_names:
+        # Only allow simple filenames (no directory traversal)
+        if not name.isalnum():
+            return jsonify({"error": "Invalid mask name", "mask": name}), 400
+        if not (BASE_DIR / "masks" / f"{name}.png").exists():
+            return jsonify({"error": "Mask not found", "mask": name}), 400
+
+    job_id = uuid.uuid4().hex
+    with scratch_dir() as scratch, scheduler.job() as budget:
+        input_path = scratch.path("input.webm")
+        request.files["video"].save(input_path)
+
+        interm_mp4 = scratch.path("interm.mp4")
+        try:
+            convert_to_mp4(input_path, interm_mp4, budget)
+        except subprocess.CalledProcessError as e:
+            return jsonify({"error": "Failed to convert WebM", "details": e.stderr.decode()}), 500
+
+        # One overlay_processor run: decode + landmarks once, every mask composited in parallel
+        overlays = [(BASE_DIR / "masks" / f"{name}.png", scratch.path(f"overlay_{name}.mp4"))
+                    for name in mask_names]
+        try:
+            stats = run_overlay_processor(interm_mp4, overlays, budget=budget)
+        except subprocess.CalledProcessError as e:
+            return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
+
+        # Browser-ready encodes run concurrently (sharing the job's cores); ffmpeg
+        # does the work outside the GIL
+        finals = {name: PROCESSED_DIR / f"{job_id}_{name}.mp4" for name in mask_names}
+        try:
+            with storage.in_use(*finals.values()), ThreadPoolExecutor(max_workers=len(mask_names)) as pool:
+                list(pool.map(lambda item: finalize_mp4(item[0], input_path, item[1], budget, len(mask_names)),
+                              [(out, finals[name]) for name, (_, out) in zip(mask_names, overlays)]))
+        except subprocess.CalledProcessError as e:
+            for path in finals.values():
+                path.unlink(missing_ok=True)
+            return jsonify({"error": "Failed to encode output", "details": e.stderr.decode()}), 500
+        finally:
+            storage.notify_write()
+
+    return jsonify({
+        "job_id": job_id,
+        "outputs": {name: f"/processed/{path.name}" for name, path in finals.items()},
+        "frame_stats": stats,
+    })
+
+def convert_to_mp4(input_path, output_path, budget=None):
+    """WebM → MP4 conversion (OpenCV needs MP4).
+
+    Video only: OpenCV would drop the audio anyway, finalize_mp4 takes it
+    straight from the upload.
+    """
+    scheduler.run([
+        "ffmpeg", "-y",
+        "-i", str(input_path),
+        "-an",
+        *X264_ARGS,
+        *(budget.ffmpeg_args() if budget else []),
+        str(output_path),
+    ], budget)
+
+def run_overlay_processor(video_path, mask_output_pairs, extra_args=(), budget=None):
+    """Run overlay_processor in a separate process for [(mask_png, output_video), ...].
+
+    With a scheduler budget, the child sizes its thread pools (and ffmpeg's)
+    to the job's cores, and follows the budget as other jobs start and finish.
+    Returns the run's frame stats (frames, reused_frames, reuse_rate).
+    """
     cmd = [
         "python",
         str(BASE_DIR / "backend" / "overlay_processor.py"),
-        interm_mp4,
-        str(mask_path),
-        output_path,
+        *extra_args,
+        str(video_path),
     ]
-    try:
-        subprocess.run(cmd, check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        # Clean up our mess
-        os.unlink(input_path)
-        os.unlink(interm_mp4)
-        os.unlink(output_path)
-        return jsonify({"error": "Processing failed", "details": e.stderr.decode()}), 500
-
-    # Final ffmpeg pass for browser-compatible output
-    # Web browsers are super picky about MP4 compatibility
-    fd, final_mp4 = tempfile.mkstemp(suffix=".mp4")
-    os.close(fd)  # Close fd so ffmpeg can write on Windows
-    try:
-        subprocess.run([
-            "ffmpeg",
-            "-y",  # overwrite if exists
-            "-i", str(output_path),
-            "-vf", "fps=30",  # ensure constant fps
-            "-c:v", "libx264",
-            "-pix_fmt", "yuv420p",
-            "-preset", "veryfast",
-            "-movflags", "+faststart",
-            final_mp4,
-        ], check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        # Fallback to unprocessed file if ffmpeg fails
-        print("[WARN] ffmpeg transcode failed, serving raw output", e.stderr.decode())
-        final_mp4 = output_path
-
-    # Load file into memory
-    with open(final_mp4, "rb") as fh:
-        video_bytes = fh.read()
-
-    # Clean up all temp files
-    os.unlink(input_path)
-    os.unlink(interm_mp4)
-    os.unlink(output_path)
-    if os.path.exists(final_mp4) and final_mp4 != output_path:
-        os.unlink(final_mp4)
-
-    # Send video back to browser
-    resp = Response(video_bytes, mimetype="video/mp4")
-    resp.headers["Content-Disposition"] = "inline; filename=processed.mp4"
-    print("[DEBUG] returning", len(video_bytes), "bytes from process-inline")
-    return resp
+    for mask_png, output_video in mask_output_pairs:
+        cmd += [str(mask_png), str(output_video)]
+    result = scheduler.run(cmd, budget, env=child_env())
+    return parse_stats(result.stdout)
+
+def add_stats_headers(resp, stats):
+    """Expose the overlay run's frame stats on a streamed video response."""
+    if "frames" in stats:
+        resp.headers["X-Frames-Reused"] = f"{stats['reused_frames']}/{stats['frames']}"
+    if "deadline" in stats:
+        report = stats["deadline"]
+        resp.headers["X-Degrade-Level"] = str(report["level"])
+        resp.headers["X-Degrade-Steps"] = ",".join(report["steps"]) or "none"
+        resp.headers["X-Deadline-Met"] = "1" if report["met"] else "0"
+
+def finalize_mp4(video_path, audio_source, output_path, budget=None, share=1):
+    """Final ffmpeg pass for browser-compatible output.
+
+    Web browsers are super picky about MP4 compatibility. The original audio
+    is muxed in here, so it costs no extra video encode. `share` encodes run
+    side by side within the same budget.
+    """
+    scheduler.run([
+        "ffmpeg",
+        "-y",  # overwrite if exists
+        "-i", str(video_path),
+        *with_audio_from(audio_source),
+        "-vf", "fps=30",  # ensure constant fps
+        *X264_ARGS,
+        *(budget.ffmpeg_args(share) if budget else []),
+        str(output_path),
+    ], budget)
 
 @app.after_request
 def add_cors_headers(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, Range, X-Profile"
+    resp.headers["Access-Control-Expose-Headers"] = (
+        "X-Images-Per-Second, X-Faces-Found, X-Profile-Id, X-Frames-Reused, "
+        "X-Degrade-Level, X-Degrade-Steps, X-Deadline-Met")
     resp.headers["Access-Control-Allow-Methods"] = "POST, GET, OPTIONS"
     return resp
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, threaded=True) 
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, threaded=True)
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import time
+
+from media import OUTPUT_FPS, thread_args, x264_args
+
+# Default request deadline as a multiple of the clip's length (2 = at most twice
+# real time); unset means no deadline
+DEFAULT_FACTOR = float(os.environ.get("FACEFILTER_DEADLINE") or 0) or None
+HEADROOM = 0.9  # aim to finish with 10% of the budget to spare
+WINDOW_FRAMES = 15  # frames between progress checks
+CALIBRATION_FRAMES = 30  # frames buffered to time the encoder before it is started
+
+# Degrade steps, cheapest quality loss first. The frame-loop steps are taken
+# while processing as the job falls behind; the output steps are chosen up
+# front, since an x264 encode can't change preset or size once started.
+FRAME_STEPS = [
+    ("half_res_detection", {"detect_scale": 0.5}),
+    ("landmarks_every_2nd_frame", {"keyframe_every": 2}),
+    ("landmarks_every_4th_frame", {"keyframe_every": 4}),
+]
+OUTPUT_STEPS = [
+    ("fast_encoder", {"preset": "ultrafast"}),
+    ("downscaled_output", {"output_scale": 0.5}),
+]
+
+
+def time_encode(frames, width, height, pix_fmt, preset=None, threads=None):
+    """Seconds per frame x264 takes for frames (raw buffers) at this preset, encoding to nowhere."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([
+        "ffmpeg", "-v", "error",
+        "-f", "rawvideo", "-pix_fmt", pix_fmt,
+        "-s", f"{width}x{height}", "-r", str(OUTPUT_FPS),
+        "-i", "pipe:0",
+        *x264_args(preset),
+        *thread_args(threads),
+        "-f", "null", "-",
+    ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for frame in frames:
+            proc.stdin.write(frame)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return (time.perf_counter() - start) / max(1, len(frames))
+
+
+class DeadlineController:
+    """Keeps a job within factor × real time by stepping down FRAME_STEPS/OUTPUT_STEPS.
+
+    The per-frame allowance is factor / fps seconds. With the clip's duration
+    known, a window is behind when the projected finish (elapsed + remaining
+    frames at the last window's cost) passes HEADROOM of the deadline; without
+    it, when the last window or the run so far is slower than the allowance.
+    Steps are only ever taken down, so the quality never oscillates.
+    """
+
+    def __init__(self, factor, duration=None, fps=OUTPUT_FPS):
+        self.factor = factor
+        self.fps = fps
+        self.allowance = factor / fps
+        self.total_frames = round(duration * fps) if duration else None
+        self.deadline = factor * duration if duration else None
+        self.settings = {"detect_scale": 1.0, "keyframe_every": 1, "preset": None, "output_scale": 1.0}
+        self.steps = []
+        self._frame_level = 0
+        self._start = time.perf_counter()
+        self._window_start = self._start
+        self._frames = 0
+        self._window_frames = 0
+
+    @property
+    def level(self):
+        return len(self.steps)
+
+    def _take(self, name, change):
+        self.steps.append(name)
+        self.settings.update(change)
+        print(f"[overlay_processor] behind deadline, degrading: {name}")
+
+    def plan_output(self, measure):
+        """Choose the encoder steps up front. measure(preset) → seconds per frame for that preset."""
+        if measure(None) > HEADROOM * self.allowance:
+            self._take(*OUTPUT_STEPS[0])
+            if measure(self.settings["preset"]) > HEADROOM * self.allowance:
+                self._take(*OUTPUT_STEPS[1])
+        # Timing the encoder is a one-off: keep it out of the next window's per-frame cost
+        self._window_start, self._window_frames = time.perf_counter(), 0
+
+    def tick(self):
+        """Call once per processed frame. Returns True when the settings just changed."""
+        self._frames += 1
+        self._window_frames += 1
+        if self._window_frames < WINDOW_FRAMES:
+            return False
+        now = time.perf_counter()
+        recent = (now - self._window_start) / self._window_frames
+        elapsed = now - self._start
+        self._window_start, self._window_frames = now, 0
+
+        if self.total_frames:
+            remaining = max(0, self.total_frames - self._frames)
+            behind = elapsed + remaining * recent > HEADROOM * self.deadline
+        else:
+            behind = recent > HEADROOM * self.allowance or elapsed > self._frames * self.allowance
+        if not behind or self._frame_level >= len(FRAME_STEPS):
+            return False
+        self._take(*FRAME_STEPS[self._frame_level])
+        self._frame_level += 1
+        return True
+
+    def report(self):
+        elapsed = time.perf_counter() - self._start
+        media = self._frames / self.fps
+        return {
+            "factor": self.factor,
+            "deadline_seconds": self.deadline,
+            "elapsed_seconds": elapsed,
+            "media_seconds": media,
+            "realtime_factor": elapsed / media if media else None,
+            "met": elapsed <= self.factor * media if media else True,
+            "level": self.level,
+            "steps": self.steps,
+        }
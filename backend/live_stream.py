@@ -0,0 +1,228 @@
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+
+from overlay_processor import apply_mask
+from resident_model import get_mask, predict_gray
+
+STATS_EVERY = 30  # frames between stats messages in composite mode
+JPEG_QUALITY = 80
+MAX_FRAME_DIM = 4096  # largest width/height accepted for raw gray frames
+
+
+class LatestFrameSlot:
+    """Single-slot mailbox: a new frame replaces any frame not yet picked up.
+
+    Keeps latency bounded when the client sends faster than we can process,
+    instead of queueing a growing backlog.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, payload):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self.received += 1
+            self._item = (self.received, time.perf_counter(), payload)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def get(self):
+        """Block until a frame arrives. Returns (seq, arrival_time, payload) or None once closed."""
+        with self._cond:
+            while self._item is None and not self._closed:
+                self._cond.wait()
+            item, self._item = self._item, None
+            return item
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.processed = 0
+        self.latencies_ms = []
+
+    def record(self, latency_ms):
+        self.processed += 1
+        self.latencies_ms.append(latency_ms)
+        # Only the recent window matters for the live numbers.
+        if len(self.latencies_ms) > 300:
+            del self.latencies_ms[:-300]
+
+    def summary(self, slot):
+        lat = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            "received": slot.received,
+            "processed": self.processed,
+            "dropped": slot.dropped,
+            "drop_rate": slot.dropped / slot.received if slot.received else 0.0,
+            "latency_ms_mean": float(lat.mean()),
+            "latency_ms_p95": float(np.percentile(lat, 95)),
+        }
+
+
+def decode_frame(payload, config):
+    """Decode a client frame. Returns (bgr_or_None, gray); raises ValueError for bad frames."""
+    if not payload:
+        raise ValueError("Empty frame")
+    if config["format"] == "gray":
+        w, h = config["width"], config["height"]
+        gray = np.frombuffer(payload, dtype=np.uint8)
+        if gray.size != w * h:
+            raise ValueError(f"Expected {w * h} bytes for {w}x{h} gray frame, got {gray.size}")
+        gray = gray.reshape(h, w)
+        if config["mode"] == "composite":
+            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), gray
+        return None, gray
+
+    buf = np.frombuffer(payload, dtype=np.uint8)
+    try:
+        if config["mode"] == "composite":
+            bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise ValueError("Could not decode JPEG frame")
+            return bgr, cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        # Landmarks only: decode straight to grayscale, skipping the colour planes.
+        gray = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    except cv2.error as e:
+        raise ValueError(f"Could not decode JPEG frame: {e}")
+    if gray is None:
+        raise ValueError("Could not decode JPEG frame")
+    return None, gray
+
+
+def parse_config(message):
+    """Validate the optional JSON config message sent before the first frame.
+
+    Raises ValueError for anything malformed, so the caller can reply with an
+    error and keep the connection open.
+    """
+    config = {"mode": "landmarks", "format": "jpeg", "mask": "cat", "width": None, "height": None}
+    try:
+        received = json.loads(message)
+    except ValueError:
+        raise ValueError("config must be a JSON object")
+    if not isinstance(received, dict):
+        raise ValueError("config must be a JSON object")
+    config.update((k, v) for k, v in received.items() if k in config)
+    if config["mode"] not in ("landmarks", "composite"):
+        raise ValueError("mode must be 'landmarks' or 'composite'")
+    if config["format"] not in ("jpeg", "gray"):
+        raise ValueError("format must be 'jpeg' or 'gray'")
+    for key in ("width", "height"):
+        if config[key] is None:
+            continue
+        try:
+            config[key] = int(config[key])
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{key} must be an integer")
+        if not 1 <= config[key] <= MAX_FRAME_DIM:
+            raise ValueError(f"{key} must be between 1 and {MAX_FRAME_DIM}")
+    if config["format"] == "gray" and not (config["width"] and config["height"]):
+        raise ValueError("gray frames need width and height")
+    if config["mode"] == "composite" and get_mask(str(config["mask"])) is None:
+        raise ValueError("Mask not found")
+    return config
+
+
+def register(app):
+    """Attach the /live WebSocket endpoint to the Flask app."""
+    sock = Sock(app)
+
+    @sock.route("/live")
+    def live(ws):
+        """Per-frame landmarks (or composited JPEGs) for a stream of client frames.
+
+        Protocol: an optional JSON text message configures the stream
+        ({"mode": "landmarks"|"composite", "format": "jpeg"|"gray",
+        "mask": "cat", "width": W, "height": H}); every binary message is one
+        frame. Landmark replies are JSON text with stats attached; composite
+        replies are binary JPEGs with a stats JSON every STATS_EVERY frames.
+        Sending the text "stats" requests a stats message at any time.
+        """
+        config = parse_config("{}")
+        slot = LatestFrameSlot()
+        stats = ConnectionStats()
+        send_lock = threading.Lock()
+
+        def send(message):
+            with send_lock:
+                ws.send(message)
+
+        def receiver():
+            nonlocal config
+            try:
+                while True:
+                    message = ws.receive()
+                    if message is None:
+                        continue
+                    if isinstance(message, str):
+                        if message == "stats":
+                            send(json.dumps({"stats": stats.summary(slot)}))
+                            continue
+                        try:
+                            config = parse_config(message)
+                            send(json.dumps({"config": config}))
+                        except ValueError as e:
+                            send(json.dumps({"error": str(e)}))
+                        continue
+                    slot.put(message)
+            except ConnectionClosed:
+                pass
+            finally:
+                slot.close()
+
+        threading.Thread(target=receiver, daemon=True).start()
+
+        try:
+            while True:
+                item = slot.get()
+                if item is None:
+                    break
+                seq, arrived, payload = item
+                # The receiver may swap config mid-frame; use one snapshot throughout
+                cfg = config
+                try:
+                    bgr, gray = decode_frame(payload, cfg)
+                except ValueError as e:
+                    send(json.dumps({"seq": seq, "error": str(e)}))
+                    continue
+
+                landmarks, bbox = predict_gray(gray)
+
+                if cfg["mode"] == "composite":
+                    if landmarks is not None:
+                        apply_mask(bgr, landmarks, get_mask(str(cfg["mask"])))
+                    ok, jpeg = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                    stats.record((time.perf_counter() - arrived) * 1000)
+                    send(jpeg.tobytes())
+                    if stats.processed % STATS_EVERY == 0:
+                        send(json.dumps({"stats": stats.summary(slot)}))
+                else:
+                    stats.record((time.perf_counter() - arrived) * 1000)
+                    send(json.dumps({
+                        "seq": seq,
+                        "landmarks": landmarks.tolist() if landmarks is not None else None,
+                        "bbox": [int(v) for v in bbox] if bbox is not None else None,
+                        "stats": stats.summary(slot),
+                    }))
+        except ConnectionClosed:
+            pass
+        finally:
+            print("[live] connection closed", json.dumps(stats.summary(slot)))
+
+    return sock
@@ -0,0 +1,172 @@
+import json
+import subprocess
+
+import numpy as np
+
+# Shared ffmpeg settings: browser-friendly H.264 in MP4
+X264_ARGS = ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-preset", "veryfast", "-movflags", "+faststart"]
+OUTPUT_FPS = 30  # constant fps of the browser output (matches the /process-inline final pass)
+
+# Audio from the original upload: the only transcode is Opus -> AAC (cheap, and
+# plays everywhere). aresample keeps it locked to the video timeline if the
+# recording's audio starts late or has gaps; -shortest trims any overhang.
+AUDIO_ARGS = ["-c:a", "aac", "-b:a", "128k", "-af", "aresample=async=1:first_pts=0", "-shortest"]
+
+
+def x264_args(preset=None):
+    """X264_ARGS, optionally with a different x264 preset (e.g. "ultrafast" when short on time)."""
+    if preset is None:
+        return list(X264_ARGS)
+    args = list(X264_ARGS)
+    args[args.index("-preset") + 1] = preset
+    return args
+
+
+def with_audio_from(source):
+    """Extra ffmpeg args that add `source`'s audio (if any) as the second input.
+
+    Put them right after the main `-i`. The video still comes from input 0.
+    """
+    return ["-i", str(source), "-map", "0:v:0", "-map", "1:a:0?", *AUDIO_ARGS]
+
+
+def mux_audio(video_path, audio_source, output_path):
+    """Copy video_path's video (no re-encode) plus audio_source's audio into output_path."""
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-i", str(video_path),
+        *with_audio_from(audio_source),
+        "-c:v", "copy",
+        "-movflags", "+faststart",
+        str(output_path),
+    ], check=True, capture_output=True)
+
+
+def probe_duration(path):
+    """Duration of path in seconds, or None if ffprobe can't tell.
+
+    MediaRecorder WebM has no duration in its header, so fall back to the last
+    video packet's timestamp.
+    """
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        str(path),
+    ], capture_output=True, text=True)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        pass
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time",
+        "-of", "csv=p=0",
+        str(path),
+    ], capture_output=True, text=True)
+    times = []
+    for line in result.stdout.split():
+        try:
+            times.append(float(line.strip(",")))
+        except ValueError:
+            pass
+    return max(times) if times else None
+
+
+def probe_video(path):
+    """Return (width, height) of the first video stream, via ffprobe."""
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height",
+        "-of", "json",
+        str(path),
+    ], check=True, capture_output=True)
+    stream = json.loads(result.stdout)["streams"][0]
+    return int(stream["width"]), int(stream["height"])
+
+
+def thread_args(threads):
+    """ffmpeg options capping its worker threads (None: ffmpeg's default, about one per core)."""
+    return ["-threads", str(threads)] if threads else []
+
+
+def open_raw_decoder(input_format="webm", fps=OUTPUT_FPS, pix_fmt="bgr24", source=None, threads=None,
+                     stderr=subprocess.DEVNULL):
+    """ffmpeg process that writes raw frames (bgr24 or yuv420p) to stdout.
+
+    Reads the container from `source` if given, otherwise from stdin. Pass a
+    file as stderr to keep ffmpeg's errors (a pipe could fill up and stall it).
+    """
+    if source is None:
+        input_args, stdin = ["-f", input_format, "-i", "pipe:0"], subprocess.PIPE
+    else:
+        input_args, stdin = ["-i", str(source)], subprocess.DEVNULL
+    return subprocess.Popen([
+        "ffmpeg", "-v", "error",
+        *thread_args(threads),
+        *input_args,
+        "-an",
+        "-vf", f"fps={fps}",
+        "-f", "rawvideo", "-pix_fmt", pix_fmt,
+        "pipe:1",
+    ], stdin=stdin, stdout=subprocess.PIPE, stderr=stderr)
+
+
+def open_raw_encoder(output_path, width, height, fps=OUTPUT_FPS, pix_fmt="bgr24", audio_source=None, threads=None,
+                     preset=None, output_size=None):
+    """ffmpeg process that reads raw frames on stdin and writes a browser-ready MP4.
+
+    With audio_source, that file's audio is muxed in during the same encode.
+    preset overrides the x264 preset, output_size=(w, h) scales the output.
+    """
+    return subprocess.Popen([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", pix_fmt,
+        "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "pipe:0",
+        *(with_audio_from(audio_source) if audio_source is not None else []),
+        *(["-vf", f"scale={output_size[0]}:{output_size[1]}"] if output_size else []),
+        *x264_args(preset),
+        *thread_args(threads),
+        str(output_path),
+    ], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def yuv420_size(width, height):
+    """Bytes in one yuv420p frame (chroma planes are rounded up for odd sizes)."""
+    return width * height + 2 * ((width + 1) // 2) * ((height + 1) // 2)
+
+
+def yuv420_planes(buf, width, height):
+    """Y, U, V views into a yuv420p frame buffer. No copies; writes go to buf."""
+    cw, ch = (width + 1) // 2, (height + 1) // 2
+    frame = np.frombuffer(buf, dtype=np.uint8)
+    y = frame[:width * height].reshape(height, width)
+    u = frame[width * height:width * height + cw * ch].reshape(ch, cw)
+    v = frame[width * height + cw * ch:].reshape(ch, cw)
+    return y, u, v
+
+
+def read_into(stream, buf):
+    """Fill buf (a bytearray) from a pipe. Returns False at EOF."""
+    view = memoryview(buf)
+    filled = 0
+    while filled < len(buf):
+        n = stream.readinto(view[filled:])
+        if not n:
+            return False
+        filled += n
+    return True
+
+
+def read_exact(stream, size):
+    """Read exactly size bytes from a pipe, or return None at EOF."""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
@@ -1,137 +1,529 @@
+import argparse
+import json
+import os
 import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import cv2
 import numpy as np
-from PIL import Image
+from deadline import CALIBRATION_FRAMES, DeadlineController, time_encode
+from media import (open_raw_decoder, open_raw_encoder, probe_duration, probe_video, read_into, yuv420_planes,
+                   yuv420_size)
+from scheduler import ThreadBudget
+from tracing import NullTracer, run_profiled, tracer_from_env
 
 # Add project root to import path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
-from faceLandmarkPredictor import FaceLandmarkPredictor  # noqa: E402
+MODEL_PATH = PROJECT_ROOT / "landmark_model.pt"
+# Named Haar profile from detector_profiles.json ("fast", "balanced", "accurate");
+# unset keeps the original detector settings
+DETECTOR_PROFILE = os.environ.get("FACEFILTER_DETECTOR_PROFILE") or None
+# Static-frame reuse: while a frame's luma stays within STATIC_THRESHOLD grey
+# levels (per thumbnail cell) of the last frame the model ran on, its landmarks
+# and warped mask are reused and only the blend is redone. 0 turns it off.
+STATIC_THRESHOLD = float(os.environ.get("FACEFILTER_STATIC_THRESHOLD", "3"))
+STATIC_MAX_REUSE = 30  # run the model at least once a second at 30 fps
+STATIC_THUMB = (32, 24)  # thumbnail cells are block means, so sensor noise averages out
+# The last stdout line of a run; the backend reads frame stats from it
+STATS_PREFIX = "[overlay_processor] stats "
 
 
-def process_video(video_path: Path, mask_path: Path, output_path: Path):
-    """Apply mask overlay to each frame using our custom facial landmark model."""
-    # Load our PyTorch model
-    predictor = FaceLandmarkPredictor(str(PROJECT_ROOT / "landmark_model.pt"))
+def load_mask(mask_path: Path) -> np.ndarray:
+    """Load a mask PNG as an H×W×4 array (alpha in the last channel)."""
+    from PIL import Image
+    return np.array(Image.open(mask_path).convert("RGBA"))
+
+
+def transform_mask(mask_np: np.ndarray, landmarks: np.ndarray):
+    """Scale and rotate the mask to fit the face.
+
+    Returns (rotated_mask, x1, y1) where (x1, y1) is the top-left corner in
+    frame coordinates (may be negative), or None if there are too few landmarks.
+    """
+    try:
+        # Extract key points for mask positioning
+        left_eye, right_eye, nose_tip = landmarks[0], landmarks[1], landmarks[2]
+    except IndexError:
+        return None
 
-    # Load mask image with alpha channel
-    mask_rgba = Image.open(mask_path).convert("RGBA")
-    mask_np = np.array(mask_rgba)
     mask_h0, mask_w0 = mask_np.shape[:2]
 
-    # Set up video reader and get basic info
-    cap = cv2.VideoCapture(str(video_path))
-    fps = cap.get(cv2.CAP_PROP_FPS) or 24
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    # Calculate angle between eyes for rotation
+    dx, dy = right_eye[0] - left_eye[0], right_eye[1] - left_eye[1]
+    angle = np.degrees(np.arctan2(dy, dx))
+
+    # Use eye distance to scale mask
+    eye_dist = np.hypot(dx, dy)
+    scale = (eye_dist * 3.0) / mask_w0
+
+    # Resize mask based on face size
+    new_w, new_h = int(mask_w0 * scale), int(mask_h0 * scale)
+    if new_w <= 0 or new_h <= 0:
+        return None
+    resized_mask = cv2.resize(mask_np, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    # Rotate mask to match face orientation
+    # Need to handle the bounds expansion from rotation
+    M = cv2.getRotationMatrix2D((new_w / 2, new_h / 2), angle, 1.0)
+    abs_cos, abs_sin = abs(M[0, 0]), abs(M[0, 1])
+    rot_w = int(new_h * abs_sin + new_w * abs_cos)
+    rot_h = int(new_h * abs_cos + new_w * abs_sin)
+    M[0, 2] += (rot_w / 2) - new_w / 2
+    M[1, 2] += (rot_h / 2) - new_h / 2
+
+    rotated_mask = cv2.warpAffine(
+        resized_mask,
+        M,
+        (rot_w, rot_h),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(0, 0, 0, 0)
+    )
+
+    # Position mask over face
+    # Center between eyes horizontally
+    center_x = int((left_eye[0] + right_eye[0]) / 2)
+    # Position vertically above nose tip
+    center_y = int(nose_tip[1] - rot_h * 0.8)
+
+    return rotated_mask, center_x - rot_w // 2, center_y
+
+
+def _blend_plane(plane: np.ndarray, overlay: np.ndarray, alpha: np.ndarray, x1: int, y1: int) -> None:
+    """Alpha-blend overlay (with 0-255 alpha) into plane at (x1, y1) in place, clipping to the plane."""
+    height, width = plane.shape[:2]
+    rot_h, rot_w = overlay.shape[:2]
+    x2, y2 = x1 + rot_w, y1 + rot_h
+
+    # Handle mask regions outside frame
+    x1c, y1c = max(0, x1), max(0, y1)
+    x2c, y2c = min(width, x2), min(height, y2)
+
+    # Calculate corresponding mask portion
+    mask_x1, mask_y1 = x1c - x1, y1c - y1
+    mask_x2, mask_y2 = mask_x1 + (x2c - x1c), mask_y1 + (y2c - y1c)
+
+    # Only blend if we have valid regions
+    if mask_x2 > mask_x1 and mask_y2 > mask_y1:
+        mask_crop = overlay[mask_y1:mask_y2, mask_x1:mask_x2]
+        frame_crop = plane[y1c:y2c, x1c:x2c]
+        a = alpha[mask_y1:mask_y2, mask_x1:mask_x2] / 255.0
+        plane[y1c:y2c, x1c:x2c] = (
+            a * mask_crop + (1 - a) * frame_crop
+        ).astype(np.uint8)
+
+
+def blend_mask(frame: np.ndarray, rotated_mask: np.ndarray, x1: int, y1: int) -> None:
+    """Alpha-blend a transformed mask into frame in place, clipping to the frame."""
+    # Alpha blending using mask's alpha channel
+    _blend_plane(frame, rotated_mask[..., :3], rotated_mask[..., 3:], x1, y1)
+
+
+# BT.601 limited range (what ffmpeg uses for yuv420p), rows Y/U/V, columns B/G/R
+_BGR_TO_YUV = np.array([
+    [24.966, 128.553, 65.481],
+    [112.0, -74.203, -37.797],
+    [-18.214, -93.786, 112.0],
+], dtype=np.float32) / 255.0
+_YUV_OFFSET = np.array([16.0, 128.0, 128.0], dtype=np.float32)
+
+
+def prepare_mask_yuv(rotated_mask: np.ndarray, x1: int, y1: int):
+    """Convert a transformed mask to the luma, alpha and half-size chroma planes blend_mask_yuv needs.
+
+    The mask colours are read as BGR, like blend_mask does, so both paths
+    produce the same picture. The result can be kept and blended into many frames.
+    """
+    # Pad to an even origin and size so every chroma sample covers whole mask pixels
+    h, w = rotated_mask.shape[:2]
+    top, left = y1 % 2, x1 % 2
+    bottom, right = (h + top) % 2, (w + left) % 2
+    if top or left or bottom or right:
+        rotated_mask = np.pad(rotated_mask, ((top, bottom), (left, right), (0, 0)))
+        x1, y1 = x1 - left, y1 - top
+
+    yuv = rotated_mask[..., :3].astype(np.float32) @ _BGR_TO_YUV.T + _YUV_OFFSET
+    alpha = rotated_mask[..., 3].astype(np.float32)
+
+    # Chroma and alpha at half resolution for the subsampled U/V planes
+    ch, cw = rotated_mask.shape[0] // 2, rotated_mask.shape[1] // 2
+    small = cv2.resize(np.dstack([yuv[..., 1], yuv[..., 2], alpha]), (cw, ch), interpolation=cv2.INTER_AREA)
+    return yuv[..., 0], alpha, small, x1, y1
+
+
+def blend_prepared_yuv(y: np.ndarray, u: np.ndarray, v: np.ndarray, prepared) -> None:
+    """Blend a prepare_mask_yuv result into yuv420p planes, touching only the mask's ROI."""
+    luma, alpha, small, x1, y1 = prepared
+    _blend_plane(y, luma, alpha, x1, y1)
+    _blend_plane(u, small[..., 0], small[..., 2], x1 // 2, y1 // 2)
+    _blend_plane(v, small[..., 1], small[..., 2], x1 // 2, y1 // 2)
+
+
+def blend_mask_yuv(y: np.ndarray, u: np.ndarray, v: np.ndarray,
+                   rotated_mask: np.ndarray, x1: int, y1: int) -> None:
+    """blend_mask for yuv420p planes, touching only the mask's ROI."""
+    blend_prepared_yuv(y, u, v, prepare_mask_yuv(rotated_mask, x1, y1))
+
+
+def apply_mask(frame: np.ndarray, landmarks: np.ndarray, mask_np: np.ndarray) -> None:
+    """Transform the mask to the landmarks and blend it into frame in place."""
+    placed = transform_mask(mask_np, landmarks)
+    if placed is not None:
+        blend_mask(frame, *placed)
+
+
+class StaticFrameDetector:
+    """Tells whether a frame is close enough to the last keyframe to reuse its landmarks.
+
+    A keyframe is a frame the model actually ran on. Frames are compared with
+    the keyframe rather than with their predecessor, so slow movement adds up
+    until it triggers a fresh prediction, and the landmarks cannot drift.
+    """
+
+    def __init__(self, threshold=STATIC_THRESHOLD, max_reuse=STATIC_MAX_REUSE):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.frames = 0
+        self.reused = 0
+        self.keyframe = -1  # index of the frame whose results are current
+        self._ref = None
+        self._since = 0
+
+    def is_static(self, gray: np.ndarray) -> bool:
+        index = self.frames
+        self.frames += 1
+        if self.threshold > 0:
+            thumb = cv2.resize(gray, STATIC_THUMB, interpolation=cv2.INTER_AREA).astype(np.int16)
+            if (self._ref is not None and self._since < self.max_reuse
+                    and np.abs(thumb - self._ref).max() <= self.threshold):
+                self._since += 1
+                self.reused += 1
+                return True
+            self._ref = thumb
+        self._since = 0
+        self.keyframe = index
+        return False
 
+    def hold(self):
+        """Count a frame that keeps the keyframe's results without being compared."""
+        self.frames += 1
+        self.reused += 1
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "reused_frames": self.reused,
+            "reuse_rate": self.reused / self.frames if self.frames else 0.0,
+        }
+
+
+def parse_stats(stdout: bytes):
+    """Frame stats from a run's captured stdout, or {} if it printed none."""
+    for line in reversed(stdout.decode(errors="replace").splitlines()):
+        if line.startswith(STATS_PREFIX):
+            return json.loads(line[len(STATS_PREFIX):])
+    return {}
+
+
+def open_writer(output_path: Path, fps: float, width: int, height: int):
+    """Open a VideoWriter with the first codec this OpenCV build supports."""
     # Try different codecs until we find one that works
     # Different OS/OpenCV builds support different codecs
     preferred_codecs = ["avc1", "mp4v", "H264", "XVID", "MJPG"]
-    out = None
     for codec in preferred_codecs:
         vw = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*codec), fps, (width, height))
         if vw.isOpened():
-            out = vw
             print(f"[overlay_processor] Using codec {codec}")
-            break
-    if out is None:
-        raise RuntimeError("Failed to open VideoWriter with any supported codec. Install ffmpeg/libx264 etc.")
-
-    # Process each frame
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Get facial landmarks
-        landmarks, _ = predictor.predict(frame)
-        if landmarks is not None:
-            try:
-                # Extract key points for mask positioning
-                left_eye, right_eye, nose_tip = landmarks[0], landmarks[1], landmarks[2]
-            except IndexError:
-                # If landmarks are detected but don't have enough points,
-                # just write the frame without mask
-                out.write(frame)
-                continue
-
-            # Calculate angle between eyes for rotation
-            dx, dy = right_eye[0] - left_eye[0], right_eye[1] - left_eye[1]
-            angle = np.degrees(np.arctan2(dy, dx))
-            
-            # Use eye distance to scale mask
-            eye_dist = np.hypot(dx, dy)
-            scale = (eye_dist * 3.0) / mask_w0
-
-            # Resize mask based on face size
-            new_w, new_h = int(mask_w0 * scale), int(mask_h0 * scale)
-            resized_mask = cv2.resize(mask_np, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-            # Rotate mask to match face orientation
-            # Need to handle the bounds expansion from rotation
-            M = cv2.getRotationMatrix2D((new_w / 2, new_h / 2), angle, 1.0)
-            abs_cos, abs_sin = abs(M[0, 0]), abs(M[0, 1])
-            rot_w = int(new_h * abs_sin + new_w * abs_cos)
-            rot_h = int(new_h * abs_cos + new_w * abs_sin)
-            M[0, 2] += (rot_w / 2) - new_w / 2
-            M[1, 2] += (rot_h / 2) - new_h / 2
-
-            rotated_mask = cv2.warpAffine(
-                resized_mask,
-                M,
-                (rot_w, rot_h),
-                flags=cv2.INTER_LINEAR,
-                borderMode=cv2.BORDER_CONSTANT,
-                borderValue=(0, 0, 0, 0)
-            )
-
-            # Position mask over face 
-            # Center between eyes horizontally
-            center_x = int((left_eye[0] + right_eye[0]) / 2)
-            # Position vertically above nose tip
-            center_y = int(nose_tip[1] - rot_h * 0.8)
-
-            # Calculate mask corners
-            x1, y1 = center_x - rot_w // 2, center_y
-            x2, y2 = x1 + rot_w, y1 + rot_h
-
-            # Handle mask regions outside frame
-            x1c, y1c = max(0, x1), max(0, y1)
-            x2c, y2c = min(width, x2), min(height, y2)
-
-            # Calculate corresponding mask portion
-            mask_x1, mask_y1 = x1c - x1, y1c - y1
-            mask_x2, mask_y2 = mask_x1 + (x2c - x1c), mask_y1 + (y2c - y1c)
-
-            # Only blend if we have valid regions
-            if mask_x2 > mask_x1 and mask_y2 > mask_y1:
-                mask_crop = rotated_mask[mask_y1:mask_y2, mask_x1:mask_x2]
-                frame_crop = frame[y1c:y2c, x1c:x2c]
-                # Alpha blending using mask's alpha channel
-                alpha = mask_crop[..., 3:] / 255.0
-                frame[y1c:y2c, x1c:x2c] = (
-                    alpha * mask_crop[..., :3] + (1 - alpha) * frame_crop
-                ).astype(np.uint8)
-
-        out.write(frame)
+            return vw
+    raise RuntimeError("Failed to open VideoWriter with any supported codec. Install ffmpeg/libx264 etc.")
+
+
+def process_video(video_path: Path, mask_path, output_path, tracer=None, budget=None):
+    """Apply mask overlay to each frame using our custom facial landmark model.
+
+    mask_path/output_path may also be equal-length lists: the video is then
+    decoded and run through the landmark model once, and each mask variant is
+    composited and encoded on its own thread. tracer (see tracing.py) records
+    per-frame stage timings when profiling. budget (see scheduler.py) sizes the
+    torch/OpenCV thread pools to this job's share of the cores.
+
+    Frames that barely differ from the last keyframe reuse its landmarks and
+    warped mask (see StaticFrameDetector). Returns the frame/reuse counts.
+    """
+    tracer = tracer or NullTracer()
+    budget = budget or ThreadBudget()
+    mask_paths = mask_path if isinstance(mask_path, (list, tuple)) else [mask_path]
+    output_paths = output_path if isinstance(output_path, (list, tuple)) else [output_path]
+    if len(mask_paths) != len(output_paths):
+        raise ValueError("Need one output path per mask")
+
+    # Load our PyTorch model. Imported here so that importing this module for
+    # its compositing helpers does not pull in torch.
+    from faceLandmarkPredictor import FaceLandmarkPredictor
+    predictor = FaceLandmarkPredictor(str(MODEL_PATH), detector_profile=DETECTOR_PROFILE)
+    budget.apply()
+
+    # Load mask images with alpha channel
+    masks = [load_mask(p) for p in mask_paths]
+
+    # Set up video reader and get basic info
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 24
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    writers = [open_writer(p, fps, width, height) for p in output_paths]
+    static = StaticFrameDetector()
+
+    if len(masks) == 1:
+        # Process each frame
+        index = 0
+        landmarks = placed = None
+        while True:
+            with tracer.span("decode", index):
+                ret, frame = cap.read()
+            if not ret:
+                break
+
+            # Get facial landmarks, unless the frame is the same as the last keyframe
+            with tracer.span("predict", index):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                fresh = not static.is_static(gray)
+                if fresh:
+                    landmarks, _ = predictor.predict_gray(gray)
+            if landmarks is not None:
+                with tracer.span("composite", index):
+                    if fresh:
+                        placed = transform_mask(masks[0], landmarks)
+                    if placed is not None:
+                        blend_mask(frame, *placed)
+
+            with tracer.span("encode", index):
+                writers[0].write(frame)
+            budget.poll()
+            index += 1
+    else:
+        _fan_out(cap, predictor, masks, writers, tracer, budget, static)
 
     cap.release()
-    out.release()
+    for out in writers:
+        out.release()
+    return static.stats()
+
+
+def _fan_out(cap, predictor, masks, writers, tracer, budget, static, max_pending=4):
+    """Decode + predict once per frame, composite/encode every mask in parallel.
+
+    Each mask gets a single-thread executor, so its frames reach its writer in
+    order. OpenCV releases the GIL in resize/warp/encode, so the variants run
+    concurrently with each other and with decoding the next frame. At most
+    max_pending frames are in flight, to bound memory. Each variant keeps its
+    warped mask until the keyframe changes.
+    """
+    placed = [(None, None)] * len(masks)  # per mask: (keyframe, transform_mask result)
+
+    def composite(frame, landmarks, keyframe, i, out, index):
+        if landmarks is not None:
+            with tracer.span("composite", index):
+                if placed[i][0] != keyframe:
+                    placed[i] = (keyframe, transform_mask(masks[i], landmarks))
+                if placed[i][1] is not None:
+                    blend_mask(frame, *placed[i][1])
+        with tracer.span("encode", index):
+            out.write(frame)
+
+    executors = [ThreadPoolExecutor(max_workers=1) for _ in masks]
+    pending = deque()
+    index = 0
+    landmarks = None
+    try:
+        while True:
+            with tracer.span("decode", index):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            with tracer.span("predict", index):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                if not static.is_static(gray):
+                    landmarks, _ = predictor.predict_gray(gray)
+
+            if len(pending) >= max_pending:
+                for f in pending.popleft():
+                    f.result()
+            # The last variant can draw on the decoded frame itself
+            copies = [frame.copy() for _ in masks[:-1]] + [frame]
+            pending.append([
+                ex.submit(composite, fr, landmarks, static.keyframe, i, out, index)
+                for i, (ex, fr, out) in enumerate(zip(executors, copies, writers))
+            ])
+            budget.poll()
+            index += 1
+        for futures in pending:
+            for f in futures:
+                f.result()
+    finally:
+        for ex in executors:
+            ex.shutdown(wait=True)
+
+
+def process_video_yuv(video_path: Path, mask_path: Path, output_path: Path, audio_source=None, tracer=None,
+                      budget=None, deadline_factor=None):
+    """process_video without BGR frames: decode straight to yuv420p and encode the final MP4.
+
+    ffmpeg decodes into one reused planar buffer. Detection and the landmark
+    crop read the Y plane in place, the mask is blended into the Y/U/V ROIs,
+    and the same buffer goes back to an x264 encoder (with audio_source's audio
+    muxed in). The output is already browser-ready, so no conversion passes
+    are needed before or after. Static frames reuse the keyframe's landmarks
+    and YUV mask planes.
+
+    With deadline_factor, the run aims to finish within that multiple of the
+    clip's length and degrades as needed (see deadline.py). The first frames
+    are held back to time the encoder before choosing its preset and size.
+    Returns the frame/reuse counts, plus the deadline report.
+    """
+    tracer = tracer or NullTracer()
+    budget = budget or ThreadBudget()
+    # Started before the model loads, so loading counts against the deadline
+    deadline = DeadlineController(deadline_factor, probe_duration(video_path)) if deadline_factor else None
+    from faceLandmarkPredictor import FaceLandmarkPredictor
+    predictor = FaceLandmarkPredictor(str(MODEL_PATH), detector_profile=DETECTOR_PROFILE)
+    budget.apply()
+    mask_np = load_mask(mask_path)
+
+    width, height = probe_video(video_path)
+    decode_log = tempfile.TemporaryFile()
+    decoder = open_raw_decoder(source=video_path, pix_fmt="yuv420p", threads=budget.threads, stderr=decode_log)
+    held = []  # processed frames waiting for the encoder (deadline runs only)
+    encoder_gone = False  # x264 exited early; its returncode/stderr tell why
+
+    def start_encoder():
+        nonlocal encoder_gone
+        preset, output_size = None, None
+        if deadline is not None:
+            deadline.plan_output(lambda p: time_encode(held, width, height, "yuv420p", p, budget.threads))
+            preset, scale = deadline.settings["preset"], deadline.settings["output_scale"]
+            if scale != 1.0:
+                output_size = (int(width * scale) // 2 * 2, int(height * scale) // 2 * 2)
+        enc = open_raw_encoder(output_path, width, height, pix_fmt="yuv420p", audio_source=audio_source,
+                               threads=budget.threads, preset=preset, output_size=output_size)
+        try:
+            for frame in held:
+                enc.stdin.write(frame)
+        except BrokenPipeError:
+            encoder_gone = True
+        held.clear()
+        return enc
+
+    encoder = start_encoder() if deadline is None else None
+    buf = bytearray(yuv420_size(width, height))
+    y, u, v = yuv420_planes(buf, width, height)  # views into buf, valid for every frame
+    static = StaticFrameDetector()
+    index = 0
+    last_model = None  # index of the last frame the model ran on
+    landmarks = prepared = None
+    try:
+        while True:
+            with tracer.span("decode", index):
+                if not read_into(decoder.stdout, buf):
+                    break
+            # Get facial landmarks straight from the luma plane
+            with tracer.span("predict", index):
+                settings = deadline.settings if deadline is not None else {}
+                if last_model is not None and index - last_model < settings.get("keyframe_every", 1):
+                    static.hold()  # degraded: landmarks on keyframes only
+                    fresh = False
+                else:
+                    fresh = not static.is_static(y)
+                if fresh:
+                    landmarks, _ = predictor.predict_gray(y, settings.get("detect_scale", 1.0))
+                    last_model = index
+            if landmarks is not None:
+                with tracer.span("composite", index):
+                    if fresh:
+                        placed = transform_mask(mask_np, landmarks)
+                        prepared = prepare_mask_yuv(*placed) if placed is not None else None
+                    if prepared is not None:
+                        blend_prepared_yuv(y, u, v, prepared)
+            with tracer.span("encode", index):
+                if encoder is not None:
+                    try:
+                        encoder.stdin.write(buf)
+                    except BrokenPipeError:
+                        encoder_gone = True
+                else:
+                    held.append(bytes(buf))
+                    if len(held) >= CALIBRATION_FRAMES:
+                        encoder = start_encoder()
+            if encoder_gone:
+                break
+            budget.poll()
+            if deadline is not None:
+                deadline.tick()
+            index += 1
+        if encoder is None:
+            encoder = start_encoder()  # clip shorter than the calibration window
+    finally:
+        decoder.stdout.close()
+        decoder.wait()
+        if encoder is not None:
+            try:
+                encoder.stdin.close()
+            except OSError:
+                pass  # encoder already gone; its returncode/stderr tell why
+            _, err = encoder.communicate()
+    # Checked first: stopping early for a dead encoder also fails the decoder (SIGPIPE)
+    if encoder.returncode != 0 or encoder_gone:
+        decode_log.close()
+        raise RuntimeError(f"ffmpeg encode failed: {err.decode(errors='replace')}")
+    # A corrupt or truncated upload must not come back as a short video
+    if decoder.returncode != 0:
+        decode_log.seek(0)
+        raise RuntimeError(f"ffmpeg decode failed: {decode_log.read().decode(errors='replace')}")
+    decode_log.close()
+    stats = static.stats()
+    if deadline is not None:
+        stats["deadline"] = deadline.report()
+    return stats
 
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python overlay_processor.py <input_video> <mask_png> <output_video>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        usage="python overlay_processor.py [--yuv [--audio SRC] [--deadline N]] <input_video> <mask_png> <output_video> "
+              "[<mask_png> <output_video> ...]")
+    parser.add_argument("input_video", type=Path)
+    parser.add_argument("pairs", nargs="+", type=Path, help="<mask_png> <output_video> pairs")
+    parser.add_argument("--yuv", action="store_true",
+                        help="Planar YUV path: decode any container, write the browser-ready MP4 directly")
+    parser.add_argument("--audio", type=Path, help="With --yuv, mux this file's audio into the output")
+    parser.add_argument("--deadline", type=float,
+                        help="With --yuv, finish within N x the clip's length, degrading quality if needed")
+    args = parser.parse_args()
+    if len(args.pairs) % 2 != 0:
+        parser.error("expected <mask_png> <output_video> pairs")
 
-    in_video = Path(sys.argv[1])
-    mask_png = Path(sys.argv[2])
-    out_video = Path(sys.argv[3])
-    process_video(in_video, mask_png, out_video)
+    mask_pngs, out_videos = args.pairs[0::2], args.pairs[1::2]
+    # Profiled only when the backend sets FACEFILTER_PROFILE_OUT for this run
+    tracer = tracer_from_env()
+    # Thread budget from the backend's scheduler; unset leaves torch/OpenCV/ffmpeg at their defaults
+    budget = ThreadBudget.from_env()
+    if args.yuv:
+        if len(mask_pngs) != 1:
+            parser.error("--yuv takes a single mask")
+        stats = run_profiled(process_video_yuv, args.input_video, mask_pngs[0], out_videos[0],
+                             audio_source=args.audio, tracer=tracer, budget=budget,
+                             deadline_factor=args.deadline)
+    elif len(mask_pngs) == 1:
+        stats = run_profiled(process_video, args.input_video, mask_pngs[0], out_videos[0], tracer=tracer,
+                             budget=budget)
+    else:
+        stats = run_profiled(process_video, args.input_video, mask_pngs, out_videos, tracer=tracer, budget=budget)
+    print(STATS_PREFIX + json.dumps(stats), flush=True)
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,87 @@
+import cProfile
+import os
+import time
+import uuid
+
+from flask import g, has_request_context, jsonify, request, send_from_directory
+
+from tracing import PROFILE_OUT_ENV
+
+# Profile every request (FACEFILTER_PROFILE=1), or only those sending
+# `X-Profile: 1` / `?profile=1`
+PROFILE_ALL = os.environ.get("FACEFILTER_PROFILE") == "1"
+PROFILE_EXTS = (".prof", ".json")
+
+
+def profiling_requested():
+    return (PROFILE_ALL
+            or request.headers.get("X-Profile", "").lower() in ("1", "true")
+            or request.args.get("profile", "").lower() in ("1", "true"))
+
+
+def child_env():
+    """Environment for an overlay_processor child, asking it to profile itself if this request is profiled."""
+    if not (has_request_context() and g.get("profile_prefix")):
+        return None  # inherit ours unchanged
+    env = dict(os.environ)
+    env[PROFILE_OUT_ENV] = g.profile_prefix
+    return env
+
+
+def register(app, profile_dir):
+    """Per-request cProfile of the Flask handler, plus /profiles to list and download results.
+
+    Profiles of request <id> are saved as <id>.handler.prof, and the overlay
+    child adds <id>.overlay.prof and <id>.trace.json (per-frame Chrome trace).
+    When a request is not profiled, the only cost is the flag check.
+    """
+    profile_dir.mkdir(exist_ok=True)
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint in ("list_profiles", "download_profile") or not profiling_requested():
+            return
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{request.endpoint}_{uuid.uuid4().hex[:8]}"
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request on this interpreter is already being profiled
+            return
+        g.profiler = profiler
+        g.profile_id = profile_id
+        g.profile_prefix = str(profile_dir / profile_id)
+
+    @app.after_request
+    def stop_profile(resp):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(g.profile_prefix + ".handler.prof")
+            resp.headers["X-Profile-Id"] = g.profile_id
+        return resp
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # after_request is skipped when the handler raises; never leave a profiler running
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+    @app.route("/profiles", methods=["GET"])
+    def list_profiles():
+        """Saved profiles, newest first, grouped by request id."""
+        groups = {}
+        for entry in os.scandir(profile_dir):
+            if not entry.name.endswith(PROFILE_EXTS):
+                continue
+            profile_id = entry.name.split(".", 1)[0]
+            st = entry.stat()
+            group = groups.setdefault(profile_id, {"id": profile_id, "created": st.st_mtime, "files": []})
+            group["files"].append({"name": entry.name, "bytes": st.st_size, "url": f"/profiles/{entry.name}"})
+            group["created"] = min(group["created"], st.st_mtime)
+        return jsonify(sorted(groups.values(), key=lambda p: p["created"], reverse=True))
+
+    @app.route("/profiles/<path:fname>", methods=["GET"])
+    def download_profile(fname):
+        return send_from_directory(profile_dir, fname, as_attachment=True)
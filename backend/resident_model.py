@@ -0,0 +1,63 @@
+# Process-wide landmark model and mask cache for in-process endpoints.
+# /upload and /process-inline still run overlay_processor in a child process;
+# the streaming endpoints share the one predictor loaded here instead.
+import threading
+from pathlib import Path
+
+from overlay_processor import DETECTOR_PROFILE, MODEL_PATH, PROJECT_ROOT, load_mask
+
+MASKS_DIR = PROJECT_ROOT / "masks"
+
+_predictor = None
+_masks = {}
+_load_lock = threading.Lock()
+
+# Haar cascades are not safe to share between threads, so inference is serialized.
+predict_lock = threading.Lock()
+
+
+def get_predictor():
+    """Load the landmark model on first use and keep it resident.
+
+    torch is only imported here, so the server starts without paying for it.
+    """
+    global _predictor
+    if _predictor is None:
+        with _load_lock:
+            if _predictor is None:
+                from faceLandmarkPredictor import FaceLandmarkPredictor
+                _predictor = FaceLandmarkPredictor(str(MODEL_PATH), detector_profile=DETECTOR_PROFILE)
+    return _predictor
+
+
+def predict_gray(gray):
+    """Thread-safe predict on a grayscale frame. Returns (landmarks, bbox)."""
+    predictor = get_predictor()
+    with predict_lock:
+        return predictor.predict_gray(gray)
+
+
+def predict_batch_gray(grays):
+    """Thread-safe batched predict: one model forward for all faces found."""
+    predictor = get_predictor()
+    with predict_lock:
+        return predictor.predict_batch_gray(grays)
+
+
+def mask_path(mask_name: str):
+    """Path of masks/<name>.png, or None if the name is unsafe or missing."""
+    # Only allow simple filenames (no directory traversal)
+    if not mask_name.isalnum():
+        return None
+    path = MASKS_DIR / f"{mask_name}.png"
+    return path if path.exists() else None
+
+
+def get_mask(mask_name: str):
+    """Decoded RGBA mask array, cached by name. None if the mask does not exist."""
+    if mask_name not in _masks:
+        path = mask_path(mask_name)
+        if path is None:
+            return None
+        _masks[mask_name] = load_mask(Path(path))
+    return _masks[mask_name]
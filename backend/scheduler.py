@@ -0,0 +1,246 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# Child-side budget: thread count, and a JSON file the scheduler rewrites when
+# the number of active jobs changes
+THREADS_ENV = "FACEFILTER_THREADS"
+BUDGET_FILE_ENV = "FACEFILTER_BUDGET_FILE"
+# Give each job a disjoint set of cores (Linux only)
+PIN_CORES = os.environ.get("FACEFILTER_PIN_CORES") == "1"
+# Cores the jobs may use, e.g. "0-5" to keep the rest for the web server; default: all we may run on
+CORES = os.environ.get("FACEFILTER_CORES")
+POLL_FRAMES = 30  # how often a running job checks its budget file
+
+
+def parse_cpu_list(text):
+    """"0-3,6" → [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in text.split(","):
+        lo, _, hi = part.strip().partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return sorted(set(cpus))
+
+
+def available_cpus():
+    if CORES:
+        return parse_cpu_list(CORES)
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _process_tree(pid):
+    """pid and its descendants, from /proc (Linux)."""
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        try:
+            for tid in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{tid}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def pin_process_tree(pid, cpus):
+    """Set the CPU affinity of every thread of pid and its children.
+
+    sched_setaffinity applies to one thread, so each task is set on its own.
+    Threads and processes started later inherit it.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    for p in _process_tree(pid):
+        try:
+            tids = [int(t) for t in os.listdir(f"/proc/{p}/task")]
+        except OSError:
+            continue
+        for tid in tids:
+            try:
+                os.sched_setaffinity(tid, cpus)
+            except OSError:
+                pass  # exited meanwhile
+
+
+class Budget:
+    """The share of the machine one job may use."""
+
+    def __init__(self, job_id, threads, cpus, budget_file):
+        self.job_id = job_id
+        self.threads = threads
+        self.cpus = cpus
+        self.budget_file = budget_file
+
+    def env(self, base=None):
+        """Environment for a child process of this job: sizes the torch/OpenMP/OpenCV pools."""
+        env = dict(base if base is not None else os.environ)
+        env[THREADS_ENV] = str(self.threads)
+        env[BUDGET_FILE_ENV] = str(self.budget_file)
+        env["OMP_NUM_THREADS"] = str(self.threads)
+        env["MKL_NUM_THREADS"] = str(self.threads)
+        return env
+
+    def ffmpeg_args(self, share=1):
+        """Output options limiting an ffmpeg encode to this budget (split `share` ways)."""
+        n = str(max(1, self.threads // share))
+        return ["-threads", n, "-filter_threads", n]
+
+    def as_dict(self):
+        return {"job_id": self.job_id, "threads": self.threads, "cpus": self.cpus}
+
+
+class CoreScheduler:
+    """Splits the available cores between the jobs currently running.
+
+    Every job gets cores // active_jobs threads (at least one). A job's child
+    processes are started with that budget in their environment. When a job
+    starts or finishes, the others are rebalanced: their budget files are
+    rewritten (the overlay processor re-sizes its pools from it) and, with
+    pinning on, their process trees are moved to their new CPU sets.
+    """
+
+    def __init__(self, cpus=None, pin=PIN_CORES):
+        self.cpus = cpus or available_cpus()
+        self.pin = pin and hasattr(os, "sched_setaffinity")
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> Budget, in start order
+        self._pids = {}  # job_id -> [pid]
+        self._dir = Path(tempfile.mkdtemp(prefix="facefilter_budgets_"))
+
+    @contextmanager
+    def job(self):
+        budget = self.acquire()
+        try:
+            yield budget
+        finally:
+            self.release(budget)
+
+    def acquire(self):
+        job_id = uuid.uuid4().hex[:8]
+        with self._lock:
+            budget = Budget(job_id, 1, [], self._dir / f"{job_id}.json")
+            self._jobs[job_id] = budget
+            self._pids[job_id] = []
+            self._rebalance()
+        return budget
+
+    def release(self, budget):
+        with self._lock:
+            self._jobs.pop(budget.job_id, None)
+            self._pids.pop(budget.job_id, None)
+            budget.budget_file.unlink(missing_ok=True)
+            self._rebalance()
+
+    def run(self, cmd, budget=None, **kwargs):
+        """subprocess.run(cmd, check=True, capture_output=True) within budget."""
+        if budget is None:
+            return subprocess.run(cmd, check=True, capture_output=True, **kwargs)
+        kwargs["env"] = budget.env(kwargs.get("env"))
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+        with self._lock:
+            if budget.job_id in self._pids:
+                self._pids[budget.job_id].append(proc.pid)
+            if self.pin:
+                pin_process_tree(proc.pid, budget.cpus)
+        try:
+            out, err = proc.communicate()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            with self._lock:
+                pids = self._pids.get(budget.job_id)
+                if pids and proc.pid in pids:
+                    pids.remove(proc.pid)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, out, err)
+        return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+
+    def status(self):
+        with self._lock:
+            return {
+                "cpus": self.cpus,
+                "pinned": self.pin,
+                "jobs": [b.as_dict() for b in self._jobs.values()],
+            }
+
+    def _rebalance(self):
+        """Give the active jobs contiguous, near-equal slices of self.cpus. Call with the lock held."""
+        jobs = list(self._jobs.values())
+        if not jobs:
+            return
+        n = len(self.cpus)
+        for i, budget in enumerate(jobs):
+            if len(jobs) <= n:
+                lo, hi = i * n // len(jobs), (i + 1) * n // len(jobs)
+                cpus = self.cpus[lo:hi]
+            else:
+                cpus = [self.cpus[i % n]]  # more jobs than cores: share round-robin
+            changed = cpus != budget.cpus
+            budget.cpus, budget.threads = cpus, len(cpus)
+            if not changed:
+                continue
+            tmp = budget.budget_file.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(budget.as_dict(), f)
+            os.replace(tmp, budget.budget_file)
+            if self.pin:
+                for pid in self._pids.get(budget.job_id, []):
+                    pin_process_tree(pid, cpus)
+
+
+class ThreadBudget:
+    """Child side: applies the job's budget to torch and OpenCV, and follows rebalancing."""
+
+    def __init__(self, threads=None, budget_file=None):
+        self.threads = threads
+        self.budget_file = budget_file
+        self._mtime = None
+        self._frames = 0
+
+    @classmethod
+    def from_env(cls):
+        threads = os.environ.get(THREADS_ENV)
+        return cls(int(threads) if threads else None, os.environ.get(BUDGET_FILE_ENV))
+
+    @property
+    def enabled(self):
+        return self.threads is not None
+
+    def apply(self):
+        """Size the torch intra-op and OpenCV pools. No-op when the job has no budget."""
+        if not self.enabled:
+            return
+        import cv2
+        import torch
+        cv2.setNumThreads(self.threads)
+        torch.set_num_threads(self.threads)
+
+    def poll(self):
+        """Call once per frame: every POLL_FRAMES frames, pick up a new budget if it changed."""
+        if not self.budget_file:
+            return
+        self._frames += 1
+        if self._frames % POLL_FRAMES:
+            return
+        try:
+            mtime = os.stat(self.budget_file).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.budget_file) as f:
+                threads = json.load(f)["threads"]
+        except (OSError, ValueError, KeyError):
+            return
+        self._mtime = mtime
+        if threads != self.threads:
+            self.threads = threads
+            self.apply()
@@ -0,0 +1,263 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import cv2
+import numpy as np
+from flask import jsonify, request, send_file
+
+from media import mux_audio, open_raw_decoder, open_raw_encoder, probe_video, read_exact
+from overlay_processor import StaticFrameDetector, blend_mask, transform_mask
+from resident_model import get_mask, mask_path, predict_gray
+
+SESSION_TIMEOUT = 10 * 60  # seconds without a chunk before a session is abandoned
+EXPIRE_INTERVAL = 60  # how often idle sessions are swept
+
+
+class RecordingSession:
+    """Processes a recording while it is being uploaded.
+
+    Chunks from MediaRecorder's timeslice mode are only decodable as one
+    continuous WebM stream, so a single ffmpeg decoder is kept alive for the
+    whole session and fed each chunk as it arrives. Decoded frames are masked
+    and piped straight into an H.264 encoder, so when the client stops only
+    the last segment is left to process.
+    """
+
+    def __init__(self, mask_name):
+        self.id = uuid.uuid4().hex
+        self.mask_np = get_mask(mask_name)
+        self.workdir = Path(tempfile.mkdtemp(prefix=f"session_{self.id}_"))
+        self.input_path = self.workdir / "input.webm"
+        self.video_path = self.workdir / "video.mp4"
+        self.output_path = self.workdir / "output.mp4"
+        self.next_seq = 0
+        self.frames = 0
+        self.error = None
+        self.finished = False
+        self.last_activity = time.time()
+
+        self._chunks = queue.Queue()
+        self._seq_lock = threading.Lock()
+        self._decoder = None
+        self._encoder = None
+        self._frame_thread = None
+        self._static = StaticFrameDetector()
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def add_chunk(self, seq, data):
+        """Queue the next chunk; returns immediately so the upload is not held up."""
+        # Retries can race each other; check and enqueue as one step so chunks stay in order
+        with self._seq_lock:
+            if seq != self.next_seq:
+                raise ValueError(f"Expected chunk {self.next_seq}, got {seq}")
+            self.next_seq += 1
+            self.last_activity = time.time()
+            self._chunks.put(data)
+
+    def finish(self, timeout=None):
+        """Flush the tail and wait for the MP4. Returns the output path."""
+        self._chunks.put(None)
+        self._feeder.join(timeout)
+        if self._frame_thread is not None:
+            self._frame_thread.join(timeout)
+        if self._encoder is not None:
+            self._encoder.stdin.close()
+            _, err = self._encoder.communicate(timeout=timeout)
+            if self._encoder.returncode != 0 and self.error is None:
+                self.error = err.decode(errors="replace")
+        elif self.error is None:
+            self.error = "No decodable video received"
+        if self.error:
+            self.finished = True
+            raise RuntimeError(self.error)
+
+        # Stream-copy the encoded video and add the recording's audio
+        try:
+            mux_audio(self.video_path, self.input_path, self.output_path)
+        except subprocess.CalledProcessError as e:
+            print("[WARN] audio mux failed, serving video only", e.stderr.decode())
+            os.replace(self.video_path, self.output_path)
+        self.finished = True
+        return self.output_path
+
+    def abort(self):
+        for proc in (self._decoder, self._encoder):
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+        self._chunks.put(None)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "chunks": self.next_seq,
+            "frames_processed": self.frames,
+            "frames_reused": self._static.reused,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+    # ---- background threads ----
+    def _feed(self):
+        """Append chunks to disk and forward them to the decoder."""
+        with open(self.input_path, "ab") as raw:
+            while True:
+                data = self._chunks.get()
+                if data is None:
+                    break
+                raw.write(data)
+                raw.flush()
+                try:
+                    if self._decoder is None:
+                        self._start_pipeline()
+                    self._decoder.stdin.write(data)
+                    self._decoder.stdin.flush()
+                except (BrokenPipeError, OSError, RuntimeError) as e:
+                    self.error = self.error or f"Decoder failed: {e}"
+                    break
+        if self._decoder is not None:
+            try:
+                self._decoder.stdin.close()
+            except OSError:
+                pass
+
+    def _start_pipeline(self):
+        # The first chunk carries the WebM header, enough for ffprobe to size the frames.
+        try:
+            self.width, self.height = probe_video(self.input_path)
+        except Exception as e:
+            raise RuntimeError(f"Could not read video header: {e}")
+        self._decode_log = tempfile.TemporaryFile()
+        self._decoder = open_raw_decoder("webm", stderr=self._decode_log)
+        self._encoder = open_raw_encoder(self.video_path, self.width, self.height)
+        self._frame_thread = threading.Thread(target=self._process_frames, daemon=True)
+        self._frame_thread.start()
+
+    def _process_frames(self):
+        frame_size = self.width * self.height * 3
+        landmarks = placed = None
+        while True:
+            buf = read_exact(self._decoder.stdout, frame_size)
+            if buf is None:
+                break
+            frame = np.frombuffer(buf, dtype=np.uint8).reshape(self.height, self.width, 3).copy()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Still stretches reuse the last keyframe's landmarks and warped mask
+            if not self._static.is_static(gray):
+                landmarks, _ = predict_gray(gray)
+                placed = transform_mask(self.mask_np, landmarks) if landmarks is not None else None
+            if placed is not None:
+                blend_mask(frame, *placed)
+            try:
+                self._encoder.stdin.write(frame.tobytes())
+            except (BrokenPipeError, OSError) as e:
+                self.error = self.error or f"Encoder failed: {e}"
+                break
+            self.frames += 1
+        # A corrupt or truncated chunk stream must not come back as a short video
+        if self._decoder.wait() != 0 and self.error is None:
+            self._decode_log.seek(0)
+            self.error = f"ffmpeg decode failed: {self._decode_log.read().decode(errors='replace')}"
+        self._decode_log.close()
+
+
+def register(app):
+    """Attach the /sessions API (process-while-recording) to the Flask app."""
+    sessions = {}
+    lock = threading.Lock()
+
+    def expire_idle():
+        now = time.time()
+        with lock:
+            stale = [s for s in sessions.values() if now - s.last_activity > SESSION_TIMEOUT]
+            for s in stale:
+                del sessions[s.id]
+        for s in stale:
+            s.abort()
+
+    def expire_loop():
+        # Abandoned sessions hold ffmpeg processes and temp dirs, so don't wait
+        # for the next POST /sessions to reclaim them
+        while True:
+            time.sleep(EXPIRE_INTERVAL)
+            try:
+                expire_idle()
+            except Exception as e:
+                print("[WARN] session expiry failed:", e)
+
+    threading.Thread(target=expire_loop, daemon=True).start()
+
+    def lookup(session_id):
+        with lock:
+            return sessions.get(session_id)
+
+    @app.route("/sessions", methods=["POST"])
+    def create_session():
+        """Start a recording session. Form/JSON field `mask` picks the mask."""
+        expire_idle()
+        body = request.get_json(silent=True)
+        mask_name = request.form.get("mask") or (body.get("mask", "cat") if isinstance(body, dict) else "cat")
+        if not isinstance(mask_name, str):
+            return jsonify({"error": "mask must be a string"}), 400
+        if mask_path(mask_name) is None:
+            return jsonify({"error": "Mask not found"}), 400
+        session = RecordingSession(mask_name)
+        with lock:
+            sessions[session.id] = session
+        return jsonify({"session_id": session.id}), 201
+
+    @app.route("/sessions/<session_id>/chunks", methods=["POST"])
+    def add_chunk(session_id):
+        """Append one timesliced WebM chunk (`chunk` file, `seq` starting at 0)."""
+        session = lookup(session_id)
+        if session is None:
+            return jsonify({"error": "Unknown session"}), 404
+        if "chunk" not in request.files:
+            return jsonify({"error": "No chunk field in form"}), 400
+        try:
+            session.add_chunk(int(request.form.get("seq", session.next_seq)),
+                              request.files["chunk"].read())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify(session.status()), 202
+
+    @app.route("/sessions/<session_id>", methods=["GET"])
+    def session_status(session_id):
+        session = lookup(session_id)
+        if session is None:
+            return jsonify({"error": "Unknown session"}), 404
+        return jsonify(session.status())
+
+    @app.route("/sessions/<session_id>/finish", methods=["POST"])
+    def finish_session(session_id):
+        """Process the remaining tail and return the finished MP4."""
+        with lock:
+            session = sessions.pop(session_id, None)
+        if session is None:
+            return jsonify({"error": "Unknown session"}), 404
+        try:
+            output_path = session.finish()
+        except Exception as e:
+            session.abort()
+            return jsonify({"error": "Processing failed", "details": str(e)}), 500
+
+        resp = send_file(output_path, mimetype="video/mp4", download_name="processed.mp4")
+        resp.call_on_close(session.abort)  # removes the session's temp dir
+        return resp
+
+    @app.route("/sessions/<session_id>", methods=["DELETE"])
+    def delete_session(session_id):
+        with lock:
+            session = sessions.pop(session_id, None)
+        if session is None:
+            return jsonify({"error": "Unknown session"}), 404
+        session.abort()
+        return "", 204
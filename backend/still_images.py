@@ -0,0 +1,142 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from flask import Response, jsonify, request
+
+from overlay_processor import apply_mask
+from resident_model import get_mask, predict_batch_gray
+
+MAX_IMAGES = 64  # per request
+JPEG_QUALITY = 90
+
+# cv2.imdecode/imencode release the GIL, so a small pool codes images in parallel
+_codec_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+
+
+class Throughput:
+    """Running images/sec over all /process-images requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.seconds = 0.0
+        self.requests = 0
+
+    def record(self, images, seconds):
+        with self._lock:
+            self.images += images
+            self.seconds += seconds
+            self.requests += 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "images": self.images,
+                "images_per_sec": self.images / self.seconds if self.seconds else None,
+            }
+
+
+def decode(data):
+    """BGR image, or None if data is empty or not an image (imdecode raises on empty input)."""
+    if not data:
+        return None
+    try:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+
+def encode(image, ext):
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if ext == ".jpg" else []
+    ok, buf = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode {ext}")
+    return buf.tobytes()
+
+
+def output_ext(filename, requested):
+    if requested in ("jpg", "png"):
+        return "." + requested
+    return ".png" if filename.lower().endswith(".png") else ".jpg"
+
+
+def register(app):
+    """Attach /process-images (batched still-photo processing) to the Flask app."""
+    throughput = Throughput()
+
+    @app.route("/process-images", methods=["POST"])
+    def process_images():
+        """Mask many photos in one request.
+
+        Form fields: `images` (repeated files), `mask` (default cat),
+        `output` = "images" (default, a ZIP of masked images) or "landmarks"
+        (JSON only), and `format` = "jpg" | "png" (default: keep the input's).
+        """
+        files = request.files.getlist("images")
+        if not files:
+            return jsonify({"error": "No images field in form"}), 400
+        if len(files) > MAX_IMAGES:
+            return jsonify({"error": f"At most {MAX_IMAGES} images per request"}), 400
+
+        landmarks_only = request.form.get("output", "images") == "landmarks"
+        mask_np = None
+        if not landmarks_only:
+            mask_np = get_mask(request.form.get("mask", "cat"))
+            if mask_np is None:
+                return jsonify({"error": "Mask not found"}), 400
+
+        start = time.perf_counter()
+        names = [f.filename or f"image{i}" for i, f in enumerate(files)]
+        images = list(_codec_pool.map(decode, [f.read() for f in files]))
+        bad = [n for n, img in zip(names, images) if img is None]
+        if bad:
+            return jsonify({"error": "Could not decode image(s)", "files": bad}), 400
+
+        grays = [cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) for img in images]
+        predictions = predict_batch_gray(grays)
+
+        if landmarks_only:
+            elapsed = time.perf_counter() - start
+            throughput.record(len(images), elapsed)
+            return jsonify({
+                "results": [{
+                    "filename": name,
+                    "landmarks": lm.tolist() if lm is not None else None,
+                    "bbox": [int(v) for v in bbox] if bbox is not None else None,
+                } for name, (lm, bbox) in zip(names, predictions)],
+                "images_per_sec": len(images) / elapsed,
+            })
+
+        for img, (lm, _) in zip(images, predictions):
+            if lm is not None:
+                apply_mask(img, lm, mask_np)
+
+        requested = request.form.get("format")
+        exts = [output_ext(n, requested) for n in names]
+        encoded = list(_codec_pool.map(encode, images, exts))
+
+        # Images are already compressed, so store rather than deflate
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            for i, (name, ext, data) in enumerate(zip(names, exts, encoded)):
+                stem = os.path.splitext(os.path.basename(name))[0] or f"image{i}"
+                zf.writestr(f"{i:03d}_{stem}{ext}", data)
+
+        elapsed = time.perf_counter() - start
+        throughput.record(len(images), elapsed)
+        resp = Response(buf.getvalue(), mimetype="application/zip")
+        resp.headers["Content-Disposition"] = "attachment; filename=processed_images.zip"
+        resp.headers["X-Images-Per-Second"] = f"{len(images) / elapsed:.2f}"
+        resp.headers["X-Faces-Found"] = str(sum(lm is not None for lm, _ in predictions))
+        return resp
+
+    @app.route("/process-images/stats", methods=["GET"])
+    def process_images_stats():
+        return jsonify(throughput.summary())
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Quotas, overridable from the environment (0 disables that limit)
+MAX_BYTES = int(float(os.environ.get("FACEFILTER_STORAGE_MAX_MB", "2048")) * 1024 * 1024)
+MAX_AGE = float(os.environ.get("FACEFILTER_STORAGE_MAX_AGE_HOURS", "24")) * 3600
+MIN_AGE = 60  # never evict files younger than this, so fresh outputs can still be fetched
+SWEEP_INTERVAL = 60
+
+
+class StorageManager:
+    """Keeps uploads/ and processed/ under a total size and age quota.
+
+    A daemon thread sweeps every SWEEP_INTERVAL seconds (and right after
+    notify_write()), deleting files past MAX_AGE and then the oldest files
+    until the total is under MAX_BYTES. Files a request holds with in_use()
+    are never deleted, however old.
+    """
+
+    def __init__(self, dirs, max_bytes=MAX_BYTES, max_age=MAX_AGE, interval=SWEEP_INTERVAL):
+        self.dirs = [Path(d) for d in dirs]
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._in_use = {}  # absolute path -> number of requests holding it
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    @contextmanager
+    def in_use(self, *paths):
+        """Keep paths from being evicted while a request reads or writes them."""
+        keys = [os.path.abspath(p) for p in paths]
+        with self._lock:
+            for key in keys:
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for key in keys:
+                    self._in_use[key] -= 1
+                    if not self._in_use[key]:
+                        del self._in_use[key]
+
+    def notify_write(self):
+        """Ask for a sweep soon, e.g. after a new upload or output was written."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:  # keep the sweeper alive whatever happens
+                print("[storage] sweep failed:", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _files(self):
+        files = []
+        for d in self.dirs:
+            for entry in os.scandir(d):
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()  # oldest first
+        return files
+
+    def usage(self):
+        files = self._files()
+        return {
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    def sweep(self):
+        now = time.time()
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            age = now - mtime
+            if age < MIN_AGE:
+                break  # sorted oldest first, so everything after is newer still
+            too_old = self.max_age and age > self.max_age
+            too_big = self.max_bytes and total > self.max_bytes
+            if not (too_old or too_big):
+                break
+            # Checked and deleted under the lock, so a file can't be claimed in between
+            with self._lock:
+                if os.path.abspath(path) in self._in_use:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self.evicted_files += 1
+            self.evicted_bytes += size
+
+
+class Scratch:
+    """A private temp directory for one request's intermediate files."""
+
+    def __init__(self, prefix="req_"):
+        self.dir = Path(tempfile.mkdtemp(prefix=prefix))
+        self.handed_off = False
+
+    def path(self, name):
+        return self.dir / name
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def hand_off(self, response):
+        """Keep the files until the response has been sent, then delete them."""
+        self.handed_off = True
+        response.call_on_close(self.cleanup)
+        return response
+
+
+@contextmanager
+def scratch_dir(prefix="req_"):
+    """Yield a Scratch that is removed on every exit path unless handed to a response."""
+    scratch = Scratch(prefix)
+    try:
+        yield scratch
+    except BaseException:
+        scratch.cleanup()
+        raise
+    else:
+        if not scratch.handed_off:
+            scratch.cleanup()
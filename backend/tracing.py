@@ -0,0 +1,77 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Set by the backend on the overlay_processor child when a request is profiled:
+# a path prefix, "<prefix>.overlay.prof" and "<prefix>.trace.json" are written
+PROFILE_OUT_ENV = "FACEFILTER_PROFILE_OUT"
+
+_NULL_SPAN = nullcontext()
+
+
+class NullTracer:
+    """Stand-in used when profiling is off; span() costs one call and a no-op with-block."""
+    enabled = False
+
+    def span(self, name, frame=None):
+        return _NULL_SPAN
+
+    def save(self, path):
+        pass
+
+
+class FrameTracer:
+    """Records per-frame stage timings as Chrome trace events (chrome://tracing, Perfetto)."""
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def span(self, name, frame=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "args": {"frame": frame} if frame is not None else {},
+            })
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def tracer_from_env():
+    return FrameTracer() if os.environ.get(PROFILE_OUT_ENV) else NullTracer()
+
+
+def run_profiled(func, *args, **kwargs):
+    """Call func under cProfile if PROFILE_OUT_ENV is set.
+
+    Saves the profile, plus the events of the `tracer` keyword argument if one
+    is passed through to func.
+    """
+    tracer = kwargs.get("tracer")
+    prefix = os.environ.get(PROFILE_OUT_ENV)
+    if not prefix:
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(prefix + ".overlay.prof")
+        if tracer is not None:
+            tracer.save(prefix + ".trace.json")
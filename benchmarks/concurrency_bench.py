@@ -0,0 +1,101 @@
+"""Total throughput of concurrent overlay jobs, with and without core budgets.
+
+Runs N copies of the /process-inline pipeline (overlay_processor --yuv) at
+once, for N = 1, 2, 4, 8, in three modes:
+
+* default   – every job sizes torch/OpenCV/ffmpeg pools to all cores (the old behaviour)
+* budgeted  – CoreScheduler splits the cores, each job uses cores/N threads
+* pinned    – budgeted, plus each job pinned to its own CPU set
+
+    python benchmarks/concurrency_bench.py --jobs 1 2 4 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from loadtest import synthesize_clip  # noqa: E402
+from scheduler import CoreScheduler  # noqa: E402
+
+OVERLAY = PROJECT_ROOT / "backend" / "overlay_processor.py"
+MASK = PROJECT_ROOT / "masks" / "cat.png"
+FPS = 30
+MODES = ("default", "budgeted", "pinned")
+
+
+def run_batch(clip, n, mode, tmp):
+    """Start n jobs together; return wall seconds until the last one finishes."""
+    scheduler = CoreScheduler(pin=(mode == "pinned"))
+    errors = []
+    start_gate = threading.Barrier(n)
+
+    def job(i):
+        out = Path(tmp) / f"{mode}_{n}_{i}.mp4"
+        cmd = [sys.executable, str(OVERLAY), "--yuv", str(clip), str(MASK), str(out)]
+        start_gate.wait()
+        try:
+            if mode == "default":
+                scheduler.run(cmd)
+            else:
+                with scheduler.job() as budget:
+                    scheduler.run(cmd, budget)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(n)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--seconds", type=int, default=10, help="Length of the synthetic clip")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--report", default="concurrency_bench.json")
+    args = parser.parse_args()
+
+    clip = synthesize_clip(args.seconds, args.width, args.height)
+    frames = args.seconds * FPS
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm caches (model file, Python bytecode, ffmpeg) before timing
+        run_batch(clip, 1, "default", tmp)
+        for n in args.jobs:
+            for mode in args.modes:
+                wall = run_batch(clip, n, mode, tmp)
+                rows.append({"jobs": n, "mode": mode, "wall_seconds": wall,
+                             "frames_per_sec": n * frames / wall,
+                             "realtime_factor": n * args.seconds / wall})
+                print(f"{n} jobs {mode:>8}: {wall:6.2f} s, {rows[-1]['frames_per_sec']:7.1f} fps total")
+
+    print(f"\n{'jobs':>4} " + " ".join(f"{m + ' fps':>13}" for m in args.modes))
+    for n in args.jobs:
+        fps = {r["mode"]: r["frames_per_sec"] for r in rows if r["jobs"] == n}
+        print(f"{n:>4} " + " ".join(f"{fps[m]:>13.1f}" for m in args.modes))
+
+    with open(args.report, "w") as f:
+        json.dump({"cpu_count": os.cpu_count(), "clip": {"seconds": args.seconds, "width": args.width,
+                                                         "height": args.height},
+                   "results": rows}, f, indent=2)
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Checks that overlay_processor --deadline holds on long synthetic clips.
+
+Runs the /process-inline pipeline (overlay_processor --yuv --deadline N) on
+long clips and compares the end-to-end wall time, including process start-up,
+with N x the clip's length. Also runs each clip without a deadline as a
+reference. Exits non-zero if any deadline is missed.
+
+    python benchmarks/deadline_check.py --factor 1.0 --clips 60x1280x720 120x1920x1080
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from loadtest import synthesize_clip  # noqa: E402
+from overlay_processor import parse_stats  # noqa: E402
+
+OVERLAY = PROJECT_ROOT / "backend" / "overlay_processor.py"
+MASK = PROJECT_ROOT / "masks" / "cat.png"
+
+
+def run(clip, output, factor=None):
+    cmd = [sys.executable, str(OVERLAY), "--yuv", "--audio", str(clip)]
+    if factor:
+        cmd += ["--deadline", str(factor)]
+    start = time.perf_counter()
+    result = subprocess.run(cmd + [str(clip), str(MASK), str(output)], check=True, capture_output=True)
+    return time.perf_counter() - start, parse_stats(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factor", type=float, default=1.0, help="Deadline as a multiple of the clip length")
+    parser.add_argument("--clips", nargs="+", default=["60x1280x720", "120x1920x1080"],
+                        help="SECONDSxWIDTHxHEIGHT synthetic clips")
+    parser.add_argument("--startup-allowance", type=float, default=3.0,
+                        help="Seconds allowed for interpreter start-up and imports, which the deadline can't see")
+    parser.add_argument("--no-reference", action="store_true", help="Skip the run without a deadline")
+    parser.add_argument("--report", default="deadline_check.json")
+    args = parser.parse_args()
+
+    rows, ok = [], True
+    with tempfile.TemporaryDirectory() as tmp:
+        for spec in args.clips:
+            seconds, width, height = (int(v) for v in spec.split("x"))
+            clip = synthesize_clip(seconds, width, height)
+            row = {"clip": spec, "seconds": seconds}
+            if not args.no_reference:
+                row["reference_wall_seconds"], _ = run(clip, Path(tmp) / "reference.mp4")
+            wall, stats = run(clip, Path(tmp) / "deadline.mp4", args.factor)
+            report = stats.get("deadline", {})
+            limit = args.factor * seconds + args.startup_allowance
+            row.update({
+                "wall_seconds": wall,
+                "limit_seconds": limit,
+                "level": report.get("level"),
+                "steps": report.get("steps"),
+                "reuse_rate": stats.get("reuse_rate"),
+                "passed": wall <= limit,
+            })
+            ok = ok and row["passed"]
+            rows.append(row)
+            ref = (f", without deadline {row['reference_wall_seconds']:.1f} s"
+                   if "reference_wall_seconds" in row else "")
+            print(f"{spec}: {wall:.1f} s of {limit:.1f} s allowed{ref}; level {row['level']} "
+                  f"{row['steps'] or ''} -> {'PASS' if row['passed'] else 'FAIL'}")
+
+    with open(args.report, "w") as f:
+        json.dump({"factor": args.factor, "startup_allowance": args.startup_allowance, "results": rows}, f,
+                  indent=2)
+    print(f"Report written to {args.report}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Load generator for the Flask backend.
+
+Synthesizes WebM clips locally with ffmpeg, replays them against a running
+backend/app.py at a fixed concurrency (closed loop) or arrival rate (open loop,
+Poisson), and reports throughput, latency percentiles, errors and the server's
+CPU/RSS over time. Named scenarios live in benchmarks/scenarios/*.json so runs
+are comparable between versions.
+
+    python backend/app.py &
+    python benchmarks/loadtest.py burst --server-pid $!
+    python benchmarks/loadtest.py steady --rate 1.0 --duration 60
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import psutil  # optional, for server CPU/RSS sampling
+except ImportError:
+    psutil = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCENARIO_DIR = Path(__file__).resolve().parent / "scenarios"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+CLIP_CACHE = Path(__file__).resolve().parent / ".clips"
+FACE_PHOTO = PROJECT_ROOT / "test_photos" / "Ira.jpg"
+
+
+# ========== Clips ==========
+def synthesize_clip(seconds, width, height, source="photo"):
+    """VP8/Opus WebM like MediaRecorder produces, cached by its parameters.
+
+    source "photo" pans slowly over a test photo so there is a face to track;
+    "still" holds the photo still (with sensor-like noise) and moves for one
+    second in every five, like someone talking to a webcam; "testsrc" is
+    ffmpeg's test pattern (no face, detector-only cost).
+    """
+    CLIP_CACHE.mkdir(exist_ok=True)
+    path = CLIP_CACHE / f"{source}_{width}x{height}_{seconds}s.webm"
+    if path.exists():
+        return path
+    if source == "photo":
+        video_in = ["-loop", "1", "-framerate", "30", "-i", str(FACE_PHOTO)]
+        vf = (f"scale={width * 1.1:.0f}:{height * 1.1:.0f}:force_original_aspect_ratio=increase,"
+              f"crop={width}:{height}:(iw-{width})/2*(1+sin(t)):(ih-{height})/2*(1+cos(t)),setsar=1")
+    elif source == "still":
+        video_in = ["-loop", "1", "-framerate", "30", "-i", str(FACE_PHOTO)]
+        vf = (f"scale={width * 1.1:.0f}:{height * 1.1:.0f}:force_original_aspect_ratio=increase,"
+              f"crop={width}:{height}:(iw-{width})/2*(1+sin(2*PI*t)*lt(mod(t\\,5)\\,1)):(ih-{height})/2,"
+              f"noise=alls=4:allf=t,setsar=1")
+    else:
+        video_in = ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30"]
+        vf = "null"
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        *video_in,
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(seconds), "-vf", vf,
+        "-c:v", "libvpx", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "1M",
+        "-c:a", "libopus",
+        str(path),
+    ], check=True, capture_output=True)
+    return path
+
+
+def multipart_body(fields, files):
+    """Encode a multipart/form-data body without third-party deps."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+# ========== Requests ==========
+def send_one(url, body, content_type, timeout):
+    start = time.perf_counter()
+    status, nbytes, error = None, 0, None
+    try:
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status = resp.status
+            nbytes = len(resp.read())
+    except urllib.error.HTTPError as e:
+        status, error = e.code, e.read()[:200].decode(errors="replace")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+    return {"start": start, "latency": end - start, "status": status, "bytes": nbytes, "error": error}
+
+
+class ServerSampler:
+    """Samples CPU% and RSS of the server process and all its children (ffmpeg, overlay_processor)."""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._procs = {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.pid and psutil is None:
+            print("[WARN] psutil not installed, skipping server CPU/RSS sampling")
+        elif self.pid:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _tree(self):
+        root = psutil.Process(self.pid)
+        return [root] + root.children(recursive=True)
+
+    def _run(self):
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            cpu, rss, count = 0.0, 0, 0
+            try:
+                for p in self._tree():
+                    # Keep Process objects so cpu_percent measures since the last sample
+                    proc = self._procs.setdefault(p.pid, p)
+                    try:
+                        cpu += proc.cpu_percent(None)
+                        rss += proc.memory_info().rss
+                        count += 1
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        pass
+            except psutil.NoSuchProcess:
+                break
+            self.samples.append({"t": time.perf_counter() - t0, "cpu_percent": cpu,
+                                 "rss_mb": rss / 2**20, "processes": count})
+            self._stop.wait(self.interval)
+
+
+def run_concurrency(url, body, content_type, concurrency, total, timeout):
+    """Closed loop: `concurrency` clients each send back-to-back until `total` requests are done."""
+    results = []
+    lock = threading.Lock()
+    remaining = [total]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            r = send_one(url, body, content_type, timeout)
+            with lock:
+                results.append(r)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_rate(url, body, content_type, rate, duration, timeout, seed=0):
+    """Open loop: Poisson arrivals at `rate` req/s for `duration` s, however slow the server is."""
+    rng = random.Random(seed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        start = time.perf_counter()
+        next_at = 0.0
+        while next_at < duration:
+            delay = start + next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send_one, url, body, content_type, timeout))
+            next_at += rng.expovariate(rate)
+        return [f.result() for f in futures]
+
+
+# ========== Report ==========
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(results, wall, clip_seconds, samples):
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in ok]
+    by_status = {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else "network_error"
+        by_status[key] = by_status.get(key, 0) + 1
+    summary = {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "error_rate": 1 - len(ok) / len(results) if results else 0.0,
+        "by_status": by_status,
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "video_seconds_per_second": len(ok) * clip_seconds / wall if wall else 0.0,
+        "latency_seconds": {
+            "mean": statistics.mean(latencies) if latencies else None,
+            **{f"p{q}": percentile(latencies, q) for q in (50, 90, 95, 99)},
+            "max": max(latencies) if latencies else None,
+        },
+        "errors": sorted({r["error"] for r in results if r["error"]})[:10],
+    }
+    if samples:
+        summary["server"] = {
+            "cpu_percent_mean": statistics.mean(s["cpu_percent"] for s in samples),
+            "cpu_percent_max": max(s["cpu_percent"] for s in samples),
+            "rss_mb_max": max(s["rss_mb"] for s in samples),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def load_scenario(name):
+    path = Path(name) if name.endswith(".json") else SCENARIO_DIR / f"{name}.json"
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", help="Name in benchmarks/scenarios/ (burst, steady, long_clips) or a .json path")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--server-pid", type=int, help="Backend PID, to sample its CPU/RSS (needs psutil)")
+    parser.add_argument("--concurrency", type=int, help="Override the scenario's concurrency")
+    parser.add_argument("--requests", type=int, help="Override the scenario's request count")
+    parser.add_argument("--rate", type=float, help="Override the scenario's arrival rate (req/s)")
+    parser.add_argument("--duration", type=float, help="Override the scenario's duration (s)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Report path (default benchmarks/results/<scenario>_<time>.json)")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    for key in ("concurrency", "requests", "rate", "duration"):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+
+    clip_cfg = scenario["clip"]
+    clip = synthesize_clip(clip_cfg["seconds"], clip_cfg["width"], clip_cfg["height"],
+                           clip_cfg.get("source", "photo"))
+    body, content_type = multipart_body({"mask": scenario.get("mask", "cat")},
+                                        {"video": ("recording.webm", clip.read_bytes(), "video/webm")})
+    url = args.url.rstrip("/") + scenario.get("endpoint", "/process-inline")
+    print(f"{args.scenario}: {scenario.get('description', '')}")
+    print(f"clip {clip.name} ({len(body) / 1024:.0f} KiB) -> {url}")
+
+    sampler = ServerSampler(args.server_pid).start()
+    start = time.perf_counter()
+    if scenario["mode"] == "rate":
+        results = run_rate(url, body, content_type, scenario["rate"], scenario["duration"], args.timeout)
+    else:
+        results = run_concurrency(url, body, content_type, scenario["concurrency"], scenario["requests"],
+                                  args.timeout)
+    wall = time.perf_counter() - start
+    sampler.stop()
+
+    summary = summarize(results, wall, clip_cfg["seconds"], sampler.samples)
+    lat = summary["latency_seconds"]
+    print(f"\n{summary['succeeded']}/{summary['requests']} ok, error rate {summary['error_rate']:.1%}, "
+          f"{summary['throughput_rps']:.2f} req/s, {summary['video_seconds_per_second']:.2f} video-s/s")
+    if lat["p50"] is not None:
+        print(f"latency p50 {lat['p50']:.2f}s  p90 {lat['p90']:.2f}s  p95 {lat['p95']:.2f}s  "
+              f"p99 {lat['p99']:.2f}s  max {lat['max']:.2f}s")
+    if "server" in summary:
+        s = summary["server"]
+        print(f"server cpu mean {s['cpu_percent_mean']:.0f}%  max {s['cpu_percent_max']:.0f}%  "
+              f"rss max {s['rss_mb_max']:.0f} MiB")
+    for err in summary["errors"]:
+        print("  error:", err)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    name = Path(args.scenario).stem
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump({
+            "scenario": name,
+            "config": scenario,
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "summary": summary,
+            "server_timeline": sampler.samples,
+            "requests": [{k: r[k] for k in ("latency", "status", "bytes")} for r in results],
+        }, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
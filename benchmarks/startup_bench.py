@@ -0,0 +1,102 @@
+"""Cold-start benchmark for the processing path.
+
+Spawns fresh interpreters that import overlay_processor, build the predictor
+and composite one frame, timing each stage from process spawn. Results are
+appended to a JSON-lines history (with the git commit) so startup cost can be
+tracked across releases.
+
+    python benchmarks/startup_bench.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HISTORY_FILE = PROJECT_ROOT / "benchmarks" / "startup_history.jsonl"
+
+# Runs in the child interpreter. Prints stage timestamps as JSON.
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import overlay_processor
+t_import_processor = time.perf_counter()
+import cv2
+from faceLandmarkPredictor import FaceLandmarkPredictor
+t_import_model = time.perf_counter()
+predictor = FaceLandmarkPredictor({model!r})
+mask = overlay_processor.load_mask({mask!r})
+t_loaded = time.perf_counter()
+frame = cv2.imread({image!r})
+landmarks, _ = predictor.predict(frame)
+if landmarks is not None:
+    overlay_processor.apply_mask(frame, landmarks, mask)
+t_frame = time.perf_counter()
+print(json.dumps({{
+    "import_overlay_processor": t_import_processor - t0,
+    "import_predictor": t_import_model - t_import_processor,
+    "load_model_and_mask": t_loaded - t_import_model,
+    "first_frame": t_frame - t_loaded,
+    "face_found": landmarks is not None,
+    "modules_loaded": sorted(m for m in ("torchvision", "sklearn", "tqdm", "dlib", "PIL") if m in sys.modules),
+}}))
+"""
+
+
+def run_once(model, mask, image):
+    code = CHILD.format(backend=str(PROJECT_ROOT / "backend"), model=model, mask=mask, image=image)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True,
+                            cwd=PROJECT_ROOT)
+    total = time.perf_counter() - start
+    stages = json.loads(result.stdout.strip().splitlines()[-1])
+    stages["spawn_to_first_frame"] = total
+    return stages
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default=str(PROJECT_ROOT / "landmark_model.pt"))
+    parser.add_argument("--mask", default=str(PROJECT_ROOT / "masks" / "cat.png"))
+    parser.add_argument("--image", default=str(PROJECT_ROOT / "test_photos" / "Ira.jpg"))
+    parser.add_argument("--history", default=str(HISTORY_FILE), help="JSON-lines file to append to")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    runs = [run_once(args.model, args.mask, args.image) for _ in range(args.runs)]
+    stage_names = [k for k, v in runs[0].items() if isinstance(v, float)]
+    median = {k: statistics.median(r[k] for r in runs) for k in stage_names}
+
+    for k in stage_names:
+        print(f"{k:28s} {median[k] * 1000:8.1f} ms (median of {args.runs})")
+    print("heavy optional modules loaded:", runs[0]["modules_loaded"] or "none")
+
+    if not args.no_save:
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "median_seconds": median,
+            "modules_loaded": runs[0]["modules_loaded"],
+        }
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
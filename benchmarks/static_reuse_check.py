@@ -0,0 +1,111 @@
+"""Quality check for static-frame reuse in overlay_processor.
+
+Runs the landmark model on every frame of a clip and, side by side, the
+reuse path (StaticFrameDetector). On every reused frame it compares the
+reused landmarks with a fresh prediction (NME, normalised by the landmark
+bbox diagonal like evaluate.py) and the composited frame with the one from
+fresh landmarks (PSNR). It fails if the reuse visibly drifts.
+
+    python benchmarks/static_reuse_check.py                       # synthetic still + moving clips
+    python benchmarks/static_reuse_check.py --video my_recording.webm --threshold 4
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+
+from evaluate import compute_nme_batch  # noqa: E402
+from faceLandmarkPredictor import FaceLandmarkPredictor  # noqa: E402
+from loadtest import synthesize_clip  # noqa: E402
+from overlay_processor import (MODEL_PATH, STATIC_THRESHOLD, StaticFrameDetector,  # noqa: E402
+                               blend_mask, load_mask, transform_mask)
+
+MASK = PROJECT_ROOT / "masks" / "cat.png"
+
+
+def check_clip(video, predictor, mask_np, threshold):
+    static = StaticFrameDetector(threshold=threshold)
+    cap = cv2.VideoCapture(str(video))
+    reused, fresh_pts, psnrs = [], [], []
+    jitter = []  # NME between consecutive fresh predictions: the model's own frame-to-frame noise
+    kept = previous = None
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        fresh, _ = predictor.predict_gray(gray)
+        if not static.is_static(gray):
+            kept = fresh
+        elif kept is not None and fresh is not None:
+            reused.append(kept)
+            fresh_pts.append(fresh)
+            want, got = frame.copy(), frame.copy()
+            for img, lm in ((want, fresh), (got, kept)):
+                placed = transform_mask(mask_np, lm)
+                if placed is not None:
+                    blend_mask(img, *placed)
+            psnrs.append(cv2.PSNR(want, got))
+        if fresh is not None and previous is not None:
+            jitter.append(compute_nme_batch(previous[None], fresh[None])[0])
+        previous = fresh
+    cap.release()
+
+    nmes = compute_nme_batch(np.array(fresh_pts), np.array(reused)) if reused else np.array([])
+    return {
+        **static.stats(),
+        "nme_mean": float(np.mean(nmes)) if len(nmes) else None,
+        "nme_p95": float(np.percentile(nmes, 95)) if len(nmes) else None,
+        "nme_max": float(np.max(nmes)) if len(nmes) else None,
+        "model_jitter_nme_p95": float(np.percentile(jitter, 95)) if jitter else None,
+        # identical composites give inf
+        "psnr_min_db": float(min(psnrs)) if psnrs else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", action="append", type=Path,
+                        help="Clip to check (repeatable). Default: synthetic still and moving clips")
+    parser.add_argument("--threshold", type=float, default=STATIC_THRESHOLD)
+    parser.add_argument("--seconds", type=int, default=20)
+    parser.add_argument("--max-nme", type=float, default=0.02, help="Fail if p95 NME of reused frames is above")
+    parser.add_argument("--min-psnr", type=float, default=35.0, help="Fail if any reused composite is below (dB)")
+    parser.add_argument("--report", default="static_reuse_check.json")
+    args = parser.parse_args()
+
+    videos = args.video or [synthesize_clip(args.seconds, 640, 480, source)
+                            for source in ("still", "photo")]
+    predictor = FaceLandmarkPredictor(str(MODEL_PATH))
+    mask_np = load_mask(MASK)
+
+    results, ok = {}, True
+    for video in videos:
+        r = check_clip(video, predictor, mask_np, args.threshold)
+        failed = ((r["nme_p95"] is not None and r["nme_p95"] > args.max_nme)
+                  or (r["psnr_min_db"] is not None and r["psnr_min_db"] < args.min_psnr))
+        r["passed"] = not failed
+        ok = ok and not failed
+        results[video.name] = r
+        fmt = lambda v, spec: "n/a" if v is None else format(v, spec)  # noqa: E731
+        print(f"{video.name}: reused {r['reused_frames']}/{r['frames']} ({r['reuse_rate']:.1%}), "
+              f"NME p95 {fmt(r['nme_p95'], '.4f')} max {fmt(r['nme_max'], '.4f')} "
+              f"(model jitter p95 {fmt(r['model_jitter_nme_p95'], '.4f')}), "
+              f"PSNR min {fmt(r['psnr_min_db'], '.1f')} dB -> {'PASS' if r['passed'] else 'FAIL'}")
+
+    with open(args.report, "w") as f:
+        json.dump({"threshold": args.threshold, "max_nme": args.max_nme, "min_psnr": args.min_psnr,
+                   "clips": results}, f, indent=2)
+    print(f"Report written to {args.report}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Data-parallel training scaling report.
+
+Trains for a few epochs with 1, 2, 4 and 8 DDP (gloo) processes on the same
+global batch and seed, and reports samples/sec, speedup and efficiency.
+First runs one batch with every combination of --channels-last, --bf16 and
+--compile, so a flag that breaks training fails fast.
+
+    python benchmarks/train_scaling.py --epochs 3 --procs 1 2 4 8
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from train_landmarks import train  # noqa: E402
+
+
+def smoke_test(args, tmp):
+    """One training batch per throughput-flag combination. Returns the failures."""
+    failures = []
+    for channels_last, bf16, compile_model in itertools.product([False, True], repeat=3):
+        flags = f"channels_last={channels_last} bf16={bf16} compile={compile_model}"
+        try:
+            train(args.images, args.annotations, epochs=1, batch_size=args.batch_size,
+                  channels_last=channels_last, bf16=bf16, compile_model=compile_model,
+                  model_name=os.path.join(tmp, "smoke.pt"), seed=args.seed, max_steps=1)
+            print(f"[smoke] {flags}: ok")
+        except Exception as e:
+            print(f"[smoke] {flags}: FAILED ({type(e).__name__}: {e})")
+            failures.append(flags)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default=str(PROJECT_ROOT / "detected_faces"))
+    parser.add_argument("--annotations", default=str(PROJECT_ROOT / "landmarks.json"))
+    parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--epochs", type=int, default=3, help="The first epoch is dropped as warm-up")
+    parser.add_argument("--batch-size", type=int, default=64, help="Global batch size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default="train_scaling.json")
+    parser.add_argument("--skip-smoke", action="store_true", help="Skip the one-batch run of each flag combination")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.skip_smoke:
+            failures = smoke_test(args, tmp)
+            if failures:
+                sys.exit(f"Smoke run failed for: {'; '.join(failures)}")
+        for nproc in args.procs:
+            stats_path = os.path.join(tmp, f"stats_{nproc}.json")
+            start = time.perf_counter()
+            train(args.images, args.annotations, epochs=args.epochs, batch_size=args.batch_size,
+                  model_name=os.path.join(tmp, f"model_{nproc}.pt"), nproc=nproc, seed=args.seed,
+                  stats_path=stats_path)
+            wall = time.perf_counter() - start
+            with open(stats_path) as f:
+                epochs = json.load(f)["epochs"]
+            timed = epochs[1:] or epochs  # skip warm-up epoch when we can
+            rows.append({
+                "nproc": nproc,
+                "samples_per_sec": sum(e["samples_per_sec"] for e in timed) / len(timed),
+                "epoch_seconds": sum(e["seconds"] for e in timed) / len(timed),
+                "final_loss": epochs[-1]["loss"],
+                "wall_seconds": wall,
+            })
+
+    base = rows[0]["samples_per_sec"]
+    print(f"\n{'procs':>5} {'samples/s':>10} {'epoch s':>8} {'speedup':>8} {'eff.':>6} {'loss':>8}")
+    for r in rows:
+        r["speedup"] = r["samples_per_sec"] / base
+        r["efficiency"] = r["speedup"] * rows[0]["nproc"] / r["nproc"]
+        print(f"{r['nproc']:>5} {r['samples_per_sec']:>10.1f} {r['epoch_seconds']:>8.2f} "
+              f"{r['speedup']:>8.2f} {r['efficiency']:>6.2f} {r['final_loss']:>8.4f}")
+
+    with open(args.report, "w") as f:
+        json.dump({"cpu_count": os.cpu_count(), "batch_size": args.batch_size, "seed": args.seed,
+                   "results": rows}, f, indent=2)
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
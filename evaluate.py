@@ -1,14 +1,21 @@
+import argparse
+import hashlib
 import time
+from multiprocessing import Pool
 
 import cv2
 import os
 import json
 import numpy as np
-from faceLandmarkPredictor import FaceLandmarkPredictor
+from annotation_store import load_annotations
+from face_detection import DEFAULT_HAAR_PARAMS
 
-FACES_DIR = "/Users/kohkihatori/Downloads/faces"
+FACES_DIR = "detected_faces"  # same default image dir as train_landmarks.py / tune_detector.py
 ANNOTATION_FILE = "landmarks.json"
 MODEL = "landmark_model.pt"
+CACHE_DIR = ".eval_cache"
+REPORT_FILE = "eval_report.json"
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
 
 # ========== Evaluation Metrics ==========
 def compute_nme(gt: np.ndarray, pred: np.ndarray) -> float:
@@ -17,62 +24,173 @@ def compute_nme(gt: np.ndarray, pred: np.ndarray) -> float:
     diag = np.linalg.norm(np.ptp(gt, axis=0))  # bbox diagonal
     return error / diag
 
+def compute_nme_batch(gts: np.ndarray, preds: np.ndarray) -> np.ndarray:
+    """Compute NME for N samples at once. gts/preds are (N, K, 2); NaN preds give NaN."""
+    errors = np.linalg.norm(gts - preds, axis=2).mean(axis=1)
+    diags = np.linalg.norm(np.ptp(gts, axis=1), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return errors / diags
+
+def compute_ced(nmes: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Cumulative error distribution: fraction of samples with NME <= t for each t.
+
+    Sorts once and binary-searches every threshold instead of rescanning all
+    samples per threshold.
+    """
+    if len(nmes) == 0:
+        return np.zeros(len(thresholds))
+    sorted_nmes = np.sort(nmes)
+    return np.searchsorted(sorted_nmes, thresholds, side='right') / len(sorted_nmes)
+
 def compute_auc(nmes: np.ndarray, max_threshold: float = 0.15, steps: int = 1000) -> float:
     thresholds = np.linspace(0, max_threshold, steps)
-    ced = [(nmes <= t).mean() for t in thresholds]
-    auc = np.trapz(ced, thresholds) / max_threshold
-    return auc
+    ced = compute_ced(nmes, thresholds)
+    # Trapezoidal rule, same result as np.trapz(ced, thresholds).
+    auc = np.sum((ced[1:] + ced[:-1]) * np.diff(thresholds)) / 2 / max_threshold
+    return float(auc)
 
 def compute_failure_rate(nmes: np.ndarray, threshold: float = 0.15) -> float:
-    return (nmes > threshold).mean()
+    return float((nmes > threshold).mean()) if len(nmes) else 0.0
 
 # ========== Evaluation Driver ==========
-def evaluate_model(gt_pred_pairs: np.ndarray):
-    nmes = []
-    detection_failures = 0
+def evaluate_model(gts: np.ndarray, preds: np.ndarray, max_threshold: float = 0.15):
+    """Compute and print metrics. Rows of preds with NaN/inf count as detection failures."""
+    detected = np.isfinite(preds).all(axis=(1, 2))
+    detection_failures = int((~detected).sum())
 
-    for index, pair in enumerate(gt_pred_pairs):
-        gt = np.array(pair[0], dtype=np.float32)
-        pred = pair[1]
+    nmes = compute_nme_batch(gts[detected], preds[detected])
+    bad = ~np.isfinite(nmes)
+    if bad.any():
+        print(f"Warning: {int(bad.sum())} non-finite NME(s) (degenerate ground truth)")
+    valid_nmes = nmes[~bad]
 
-        if pred is None or len(pred) == 0:
-            nmes.append(np.nan)
-            detection_failures += 1
-            continue
+    mean_nme = float(valid_nmes.mean()) if len(valid_nmes) else float('nan')
+    auc = compute_auc(valid_nmes, max_threshold)
+    fail_rate = compute_failure_rate(valid_nmes, max_threshold)
 
-        pred = np.array(pred, dtype=np.float32)
-        nme = compute_nme(gt, pred)
+    thresholds = np.linspace(0, max_threshold, 16)
+    ced = compute_ced(valid_nmes, thresholds)
 
-        if np.isnan(nme):
-            print("Warning: NaN NME", gt, pred, index)
+    print(f"Detection Failures: {detection_failures}/{len(gts)}")
+    print(f"Mean NME: {mean_nme:.4f}")
+    print(f"AUC@{max_threshold}: {auc:.4f}")
+    print(f"Failure Rate @{max_threshold}: {fail_rate * 100:.2f}%")
 
-        nmes.append(nme)
+    return {
+        "num_images": int(len(gts)),
+        "detection_failures": detection_failures,
+        "mean_nme": mean_nme,
+        "auc": auc,
+        "auc_threshold": max_threshold,
+        "failure_rate": fail_rate,
+        "ced": {"thresholds": thresholds.tolist(), "fraction": ced.tolist()},
+    }
 
-    nmes = np.array(nmes)
-    valid_nmes = nmes[~np.isnan(nmes)]
+# ========== Inference Pipeline ==========
+_worker_predictor = None
 
-    mean_nme = valid_nmes.mean()
-    auc = compute_auc(valid_nmes)
-    fail_rate = compute_failure_rate(valid_nmes)
+def _init_worker(model, threads):
+    """Load one predictor per worker process."""
+    global _worker_predictor
+    import torch
+    from faceLandmarkPredictor import FaceLandmarkPredictor
+    if threads:
+        torch.set_num_threads(threads)
+    _worker_predictor = FaceLandmarkPredictor(model)
 
-    print(f"Detection Failures: {detection_failures}/{len(gt_pred_pairs)}")
-    print(f"Mean NME: {mean_nme:.4f}")
-    print(f"AUC@0.15: {auc:.4f}")
-    print(f"Failure Rate @0.15: {fail_rate * 100:.2f}%")
+def _predict_file(path):
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    prediction, _ = _worker_predictor.predict(image)
+    return prediction
 
-# ========== Inference Pipeline ==========
-def get_gt_pred_pair(model, faces_dir, gts):
-    predictor = FaceLandmarkPredictor(model)
-    image_files = sorted([f for f in os.listdir(faces_dir) if f.endswith(('.jpg', '.png'))])
-    pairs = []
-    for fname in image_files:
-        image = cv2.imread(os.path.join(faces_dir, fname))
-        gt = gts[fname]
-        prediction, _ = predictor.predict(image)
-        if prediction is None:
+def model_hash(model_path):
+    """SHA-256 of the weights file, used to key the prediction cache."""
+    h = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def predict_all(model, faces_dir, image_files, workers=1):
+    """Run the predictor over image_files. Returns (N, 5, 2) float32 preds (NaN = no face) and seconds."""
+    paths = [os.path.join(faces_dir, f) for f in image_files]
+    start = time.perf_counter()
+    if workers > 1:
+        # One intra-op thread per worker so N processes don't fight over cores.
+        chunksize = max(1, len(paths) // (workers * 4))
+        with Pool(workers, initializer=_init_worker, initargs=(model, 1)) as pool:
+            results = pool.map(_predict_file, paths, chunksize=chunksize)
+    else:
+        _init_worker(model, 0)
+        results = [_predict_file(p) for p in paths]
+    elapsed = time.perf_counter() - start
+
+    preds = np.full((len(paths), 5, 2), np.nan, dtype=np.float32)
+    for i, (fname, pred) in enumerate(zip(image_files, results)):
+        if pred is None:
             print(f"Warning: No face detected in {fname}")
-        pairs.append([gt, prediction])
-    return np.array(pairs, dtype=object)
+            continue
+        preds[i] = np.asarray(pred, dtype=np.float32).reshape(-1, 2)[:5]
+    return preds, elapsed
+
+def file_stamp(path):
+    """(mtime_ns, size) of an image; a changed stamp invalidates its cached prediction."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def cached_predictions(model, faces_dir, image_files, cache_dir=CACHE_DIR, workers=1, use_cache=True):
+    """Predictions keyed by model hash, faces dir and detector params, so metric-only reruns skip inference.
+
+    Each image's mtime and size are stored alongside its prediction; images
+    that were replaced since are predicted again. Returns (preds, stats) where
+    stats holds the timing of the run that produced the predictions and
+    whether they came from the cache.
+    """
+    digest = model_hash(model)
+    key = hashlib.sha256(json.dumps({
+        "model": digest,
+        "faces_dir": os.path.abspath(faces_dir),
+        "detector": DEFAULT_HAAR_PARAMS,  # predict_all uses the predictor's defaults
+    }, sort_keys=True).encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key[:16]}.npz")
+    stamps = {f: file_stamp(os.path.join(faces_dir, f)) for f in image_files}
+    preds_by_name, stamps_by_name = {}, {}
+    stats = None
+
+    if use_cache and os.path.exists(cache_path):
+        data = np.load(cache_path)
+        names = data["names"].tolist()
+        preds_by_name = dict(zip(names, data["preds"]))
+        stamps_by_name = dict(zip(names, map(tuple, data["stamps"].tolist())))
+        stats = {"seconds": float(data["seconds"]), "images": int(data["images"])}
+
+    missing = [f for f in image_files if f not in preds_by_name or stamps_by_name.get(f) != stamps[f]]
+    if missing:
+        new_preds, elapsed = predict_all(model, faces_dir, missing, workers)
+        preds_by_name.update(zip(missing, new_preds))
+        stamps_by_name.update((f, stamps[f]) for f in missing)
+        stats = {"seconds": elapsed, "images": len(missing)}
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            names = sorted(preds_by_name)
+            np.savez(cache_path, names=np.array(names),
+                     preds=np.stack([preds_by_name[n] for n in names]),
+                     stamps=np.array([stamps_by_name[n] for n in names], dtype=np.int64),
+                     seconds=stats["seconds"], images=stats["images"])
+
+    if stats is None:
+        stats = {"seconds": 0.0, "images": 0}
+    preds = np.stack([preds_by_name[f] for f in image_files]) if image_files \
+        else np.zeros((0, 5, 2), dtype=np.float32)
+    stats.update({
+        "model_sha256": digest,
+        "cached": not missing,
+        "workers": workers,
+        "images_per_sec": stats["images"] / stats["seconds"] if stats["seconds"] > 0 else None,
+    })
+    return preds, stats
 
 def parse_celeba_landmarks(filepath, faces_dir):
     with open(filepath, 'r') as f:
@@ -98,10 +216,17 @@ def parse_celeba_landmarks(filepath, faces_dir):
 
     return landmarks_dict
 
+def load_ground_truth(annotations, faces_dir):
+    """Load CelebA landmark lists (.txt) or our landmarks.json / .jsonl / .npz formats."""
+    if annotations.endswith('.txt'):
+        return parse_celeba_landmarks(annotations, faces_dir)
+    gts = load_annotations(annotations)
+    return {k: v for k, v in gts.items() if os.path.exists(os.path.join(faces_dir, k))}
+
 def display(faces_dir, gts):
     image_files = sorted([f for f in os.listdir(faces_dir) if f.endswith(('.jpg', '.png'))])
     for fname in image_files:
-        img = cv2.imread(os.path.join(FACES_DIR, fname))
+        img = cv2.imread(os.path.join(faces_dir, fname))
         points = gts[fname]
         for i, (x, y) in enumerate(points):
             cv2.circle(img, (x, y), 3, (0, 255, 0), -1)
@@ -114,8 +239,47 @@ def display(faces_dir, gts):
 
 
 # ========== Main ==========
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the landmark model (NME / CED / AUC).")
+    parser.add_argument("--faces-dir", default=FACES_DIR, help="Directory with evaluation images")
+    parser.add_argument("--annotations", default=ANNOTATION_FILE,
+                        help="Ground truth: landmarks.json/.jsonl/.npz or a CelebA list_landmarks_*.txt")
+    parser.add_argument("--model", default=MODEL, help="Model weights (.pt)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Prediction processes (1 = run in this process)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Where cached predictions are kept")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run prediction")
+    parser.add_argument("--threshold", type=float, default=0.15, help="AUC / failure threshold")
+    parser.add_argument("--report", default=REPORT_FILE, help="JSON report output path")
+    parser.add_argument("--display", action="store_true", help="Show ground truth and exit")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    gts = parse_celeba_landmarks("/Users/kohkihatori/Downloads/list_landmarks_align_celeba.txt", FACES_DIR)
-    # display(FACES_DIR, gts)
-    gt_pred_pairs = get_gt_pred_pair(MODEL, FACES_DIR, gts)
-    evaluate_model(gt_pred_pairs)
+    args = parse_args()
+    gts = load_ground_truth(args.annotations, args.faces_dir)
+    if args.display:
+        display(args.faces_dir, gts)
+        raise SystemExit(0)
+
+    image_files = sorted(f for f in gts if f.lower().endswith(IMAGE_EXTS))
+    gt_array = np.array([gts[f] for f in image_files], dtype=np.float32).reshape(-1, 5, 2)
+
+    preds, timing = cached_predictions(args.model, args.faces_dir, image_files,
+                                       cache_dir=args.cache_dir, workers=args.workers,
+                                       use_cache=not args.no_cache)
+    metrics = evaluate_model(gt_array, preds, args.threshold)
+    if timing["images_per_sec"]:
+        source = "cached run" if timing["cached"] else f"{timing['workers']} worker(s)"
+        print(f"Throughput: {timing['images_per_sec']:.1f} images/sec ({source})")
+
+    report = {
+        "model": args.model,
+        "annotations": args.annotations,
+        "faces_dir": args.faces_dir,
+        "metrics": metrics,
+        "throughput": timing,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
@@ -1,79 +1,19 @@
-# dlib is optional; we mostly use Haar cascades. Import lazily.
+# LFW face-cropping script. The detection helpers live in face_detection.py so
+# the runtime path does not pay for this script's dataset dependencies.
 import cv2
-try:
-    import dlib
-except ImportError:
-    dlib = None
 import numpy as np
 import os
 import json
-from sklearn.datasets import fetch_lfw_people
-from tqdm import tqdm  # progress bar
+from face_detection import non_max_suppression, detect_faces_haar, detect_faces_dlib  # noqa: F401
 
 
-def non_max_suppression(boxes, overlapThresh=0.3):
-    if len(boxes) == 0:
-        return [], 0, 0  # No boxes, no removals
-
-    original_count = len(boxes)
-
-    boxes = np.array(boxes).astype("float")
-    pick = []
-
-    x1 = boxes[:,0]
-    y1 = boxes[:,1]
-    x2 = boxes[:,0] + boxes[:,2]
-    y2 = boxes[:,1] + boxes[:,3]
-
-    area = (x2 - x1) * (y2 - y1)
-    idxs = np.argsort(y2)
-
-    while len(idxs) > 0:
-        last = idxs[-1]
-        pick.append(last)
-
-        xx1 = np.maximum(x1[last], x1[idxs[:-1]])
-        yy1 = np.maximum(y1[last], y1[idxs[:-1]])
-        xx2 = np.minimum(x2[last], x2[idxs[:-1]])
-        yy2 = np.minimum(y2[last], y2[idxs[:-1]])
-
-        w = np.maximum(0, xx2 - xx1)
-        h = np.maximum(0, yy2 - yy1)
-
-        overlap = (w * h) / area[idxs[:-1]]
-
-        idxs = np.delete(idxs, np.concatenate(([len(idxs) - 1],
-                                               np.where(overlap > overlapThresh)[0])))
-
-    final_boxes = boxes[pick].astype("int")
-    kept_count = len(final_boxes)
-    removed_count = original_count - kept_count
-
-    return final_boxes, kept_count, removed_count
-
-
-def detect_faces_haar(img_gray, face_cascade):
-    faces = face_cascade.detectMultiScale(
-        img_gray,
-        scaleFactor=1.02,
-        minNeighbors=4,
-        minSize=(40, 40)
-    )
-    return [(x, y, w, h) for (x, y, w, h) in faces]
-
-
-def detect_faces_dlib(img_gray, hog_face_detector):
-    if hog_face_detector is None:
-        return []
-    dlib_faces = hog_face_detector(img_gray, 1)
-    faces = []
-    for rect in dlib_faces:
-        x = rect.left()
-        y = rect.top()
-        w = rect.right() - x
-        h = rect.bottom() - y
-        faces.append((x, y, w, h))
-    return faces
+def load_dlib():
+    """dlib is optional; we mostly use Haar cascades."""
+    try:
+        import dlib
+    except ImportError:
+        return None
+    return dlib
 
 if __name__ == "__main__":
     # --- SETTINGS ---
@@ -86,11 +26,14 @@ if __name__ == "__main__":
     if OUTPUT_CROPPED_FACES and not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
+    # Dataset tooling, only needed by this script
+    from sklearn.datasets import fetch_lfw_people
+    from tqdm import tqdm  # progress bar
+
     # Load detectors
     face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-    hog_face_detector = dlib.get_frontal_face_detector()
-    if dlib is None:
-        hog_face_detector = None
+    dlib = load_dlib()
+    hog_face_detector = dlib.get_frontal_face_detector() if dlib is not None else None
 
     # Load LFW dataset
     lfw_dataset = fetch_lfw_people(min_faces_per_person=5, resize=1.0)
@@ -2,25 +2,38 @@ import torch
 import cv2
 import numpy as np
 from landmark_model import LandmarkCNN
-from torchvision import transforms
-from face import detect_faces_haar
+from face_detection import DEFAULT_HAAR_PARAMS, detect_faces_haar, load_detector_profile
+
+
+def to_tensor(gray):
+    """uint8 H×W image -> float 1×1×H×W tensor in [0, 1] (what ToTensor().unsqueeze(0) gave)."""
+    return torch.from_numpy(gray).float().div_(255.0)[None, None]
 
 
 class FaceLandmarkPredictor:
-    def __init__(self, model_path, cascade_path=None, image_size=96):
+    def __init__(self, model_path, cascade_path=None, image_size=96, detector_profile=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = LandmarkCNN().to(self.device)
         self.model.load_state_dict(torch.load(model_path, map_location=self.device))
         self.model.eval()
 
         self.image_size = image_size
-        self.transform = transforms.ToTensor()
         self.face_cascade = cv2.CascadeClassifier(
             cascade_path or cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
         )
-
-    def detect_faces(self, gray_image):
-        return detect_faces_haar(gray_image, self.face_cascade)
+        # Named speed/recall trade-off from detector_profiles.json (see tune_detector.py)
+        self.detector_params = (load_detector_profile(detector_profile) if detector_profile
+                                else dict(DEFAULT_HAAR_PARAMS))
+
+    def detect_faces(self, gray_image, scale=1.0):
+        """Haar detection, optionally on a downscaled copy (boxes are returned in full-size coordinates)."""
+        if scale == 1.0:
+            return detect_faces_haar(gray_image, self.face_cascade, **self.detector_params)
+        small = cv2.resize(gray_image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        params = dict(self.detector_params)
+        params["min_size"] = max(1, int(params["min_size"] * scale))
+        faces = detect_faces_haar(small, self.face_cascade, **params)
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
 
     def select_face(self, faces, img_shape):
         center_x = img_shape[1] // 2
@@ -36,7 +49,14 @@ class FaceLandmarkPredictor:
 
     def predict(self, bgr_image):
         gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
-        faces = self.detect_faces(gray)
+        return self.predict_gray(gray)
+
+    def crop_face(self, gray, detect_scale=1.0):
+        """Detect and crop the main face. Returns (image_size² crop, bbox) or (None, None).
+
+        detect_scale < 1 runs detection on a smaller copy; the crop still comes from gray.
+        """
+        faces = self.detect_faces(gray, detect_scale)
 
         if not faces:
             return None, None  # no face
@@ -44,15 +64,48 @@ class FaceLandmarkPredictor:
         x, y, w, h = self.select_face(faces, gray.shape)
         face_crop = gray[y:y+h, x:x+w]
         resized = cv2.resize(face_crop, (self.image_size, self.image_size))
-        tensor = self.transform(resized).unsqueeze(0).to(self.device)
+        return resized, (x, y, w, h)
+
+    def predict_gray(self, gray, detect_scale=1.0):
+        """Same as predict() for a single-channel uint8 image."""
+        resized, bbox = self.crop_face(gray, detect_scale)
+        if resized is None:
+            return None, None
+
+        tensor = to_tensor(resized).to(self.device)
 
         with torch.no_grad():
             output = self.model(tensor).cpu().numpy().reshape(-1, 2)
 
         # Rescale to original image coordinates
+        x, y, w, h = bbox
         output *= [w, h]
         output += [x, y]
-        return output, (x, y, w, h)
+        return output, bbox
+
+    def predict_batch_gray(self, grays):
+        """predict_gray for many images with one LandmarkCNN forward over all found faces.
+
+        Returns a list of (landmarks, bbox), (None, None) where no face was found.
+        """
+        results = [(None, None)] * len(grays)
+        crops, found = [], []
+        for i, gray in enumerate(grays):
+            resized, bbox = self.crop_face(gray)
+            if resized is not None:
+                crops.append(resized)
+                found.append((i, bbox))
+        if not crops:
+            return results
+
+        tensor = torch.from_numpy(np.stack(crops)).float().div_(255.0)[:, None].to(self.device)
+        with torch.no_grad():
+            outputs = self.model(tensor).cpu().numpy().reshape(len(crops), -1, 2)
+
+        for output, (i, (x, y, w, h)) in zip(outputs, found):
+            # Rescale to original image coordinates
+            results[i] = (output * [w, h] + [x, y], (x, y, w, h))
+        return results
 
     def draw_landmarks(self, image, landmarks):
         for (px, py) in landmarks.astype(np.int32):
@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detector_profiles.json")
+
+# Original hard-coded Haar settings, used when no profile is given
+DEFAULT_HAAR_PARAMS = {"scale_factor": 1.02, "min_neighbors": 4, "min_size": 40, "min_size_ratio": 0.0}
+
+
+def non_max_suppression(boxes, overlapThresh=0.3):
+    if len(boxes) == 0:
+        return [], 0, 0  # No boxes, no removals
+
+    original_count = len(boxes)
+
+    boxes = np.array(boxes).astype("float")
+    pick = []
+
+    x1 = boxes[:,0]
+    y1 = boxes[:,1]
+    x2 = boxes[:,0] + boxes[:,2]
+    y2 = boxes[:,1] + boxes[:,3]
+
+    area = (x2 - x1) * (y2 - y1)
+    idxs = np.argsort(y2)
+
+    while len(idxs) > 0:
+        last = idxs[-1]
+        pick.append(last)
+
+        xx1 = np.maximum(x1[last], x1[idxs[:-1]])
+        yy1 = np.maximum(y1[last], y1[idxs[:-1]])
+        xx2 = np.minimum(x2[last], x2[idxs[:-1]])
+        yy2 = np.minimum(y2[last], y2[idxs[:-1]])
+
+        w = np.maximum(0, xx2 - xx1)
+        h = np.maximum(0, yy2 - yy1)
+
+        overlap = (w * h) / area[idxs[:-1]]
+
+        idxs = np.delete(idxs, np.concatenate(([len(idxs) - 1],
+                                               np.where(overlap > overlapThresh)[0])))
+
+    final_boxes = boxes[pick].astype("int")
+    kept_count = len(final_boxes)
+    removed_count = original_count - kept_count
+
+    return final_boxes, kept_count, removed_count
+
+
+def load_detector_profile(name, path=PROFILES_FILE):
+    """Haar parameters for a named profile ("fast", "balanced", "accurate") from detector_profiles.json."""
+    with open(path, 'r') as f:
+        profiles = json.load(f)["profiles"]
+    if name not in profiles:
+        raise ValueError(f"Unknown detector profile {name!r}; choose from {sorted(profiles)}")
+    params = dict(DEFAULT_HAAR_PARAMS)
+    params.update({k: v for k, v in profiles[name].items() if k in DEFAULT_HAAR_PARAMS})
+    return params
+
+
+def min_face_size(img_shape, min_size=40, min_size_ratio=0.0):
+    """Smallest face side in pixels: an absolute floor, or a fraction of the shorter frame side."""
+    side = max(min_size, int(min_size_ratio * min(img_shape[:2])))
+    return side, side
+
+
+def detect_faces_haar(img_gray, face_cascade, scale_factor=1.02, min_neighbors=4,
+                      min_size=40, min_size_ratio=0.0):
+    faces = face_cascade.detectMultiScale(
+        img_gray,
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=min_face_size(img_gray.shape, min_size, min_size_ratio)
+    )
+    return [(x, y, w, h) for (x, y, w, h) in faces]
+
+
+def detect_faces_dlib(img_gray, hog_face_detector):
+    if hog_face_detector is None:
+        return []
+    dlib_faces = hog_face_detector(img_gray, 1)
+    faces = []
+    for rect in dlib_faces:
+        x = rect.left()
+        y = rect.top()
+        w = rect.right() - x
+        h = rect.bottom() - y
+        faces.append((x, y, w, h))
+    return faces
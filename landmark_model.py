@@ -35,7 +35,7 @@ class LandmarkCNN(nn.Module):
 
     def forward(self, x):
         x = self.conv(x)
-        x = x.view(x.size(0), -1)
+        x = torch.flatten(x, 1)  # works for channels_last activations too, unlike view()
         x = self.fc(x)
         return x
 
@@ -1,13 +1,14 @@
+import argparse
 import cv2
 import os
 import json
+from annotation_store import append_annotation, compact, load_log, LOG_FILE, JSON_FILE, NPZ_FILE
 
 FACES_DIR = "detected_faces"
-OUTPUT_FILE = "landmarks.json"
+OUTPUT_FILE = JSON_FILE
 TARGET_POINTS = ["left_eye", "right_eye", "nose", "mouth_left", "mouth_right"]
 
 current_points = []
-annotations = {}
 current_filename = None
 
 def mouse_callback(event, x, y, flags, param):
@@ -23,44 +24,73 @@ def draw_landmarks(img, points):
         cv2.putText(img, str(i+1), (x+5, y-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
     return img
 
-def save_annotations():
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(annotations, f, indent=4)
-    print(f"Saved in {OUTPUT_FILE}")
-
-image_files = sorted([f for f in os.listdir(FACES_DIR) if f.endswith(('.jpg', '.png', '.jpeg'))])
-cv2.namedWindow("Image")
-cv2.setMouseCallback("Image", mouse_callback)
-
-counter = 0
-for fname in image_files:
-    current_filename = fname
-    current_points = []
-
-    img = cv2.imread(os.path.join(FACES_DIR, fname))
-    clone = img.copy()
-
-    print(f"\nLadnmarks for: {fname}")
-    print(f"Click on {len(TARGET_POINTS)} 5 points in order: {', '.join(TARGET_POINTS)}")
-
-    while True:
-        display = draw_landmarks(clone.copy(), current_points)
-        cv2.imshow("Image", display)
-        key = cv2.waitKey(10) & 0xFF
-
-        if key == 13 and len(current_points) == len(TARGET_POINTS):  # Enter
-            counter += 1
-            annotations[fname] = current_points
-            print(f"Landmarks saved. Counter: {counter}. Go to the next image.")
-            break
-        elif key == ord('r'):
-            current_points = []
-            print("Reset landmarks.")
-        elif key == 27 or key == ord('q'):  # Esc or q
-            print("Exit.")
-            save_annotations()
-            cv2.destroyAllWindows()
-            exit(0)
-
-save_annotations()
-cv2.destroyAllWindows()
+def already_labeled(log_path, json_path):
+    """Filenames labeled in earlier sessions (compacted JSON plus the live log)."""
+    done = set()
+    if os.path.exists(json_path):
+        with open(json_path, 'r') as f:
+            done.update(json.load(f).keys())
+    done.update(load_log(log_path + ".compacting").keys())  # left by an interrupted compact
+    done.update(load_log(log_path).keys())
+    return done
+
+def label(faces_dir, log_path, json_path):
+    """Label every image not labeled yet. Each Enter appends to the log immediately."""
+    global current_points, current_filename
+
+    done = already_labeled(log_path, json_path)
+    image_files = sorted([f for f in os.listdir(faces_dir)
+                          if f.endswith(('.jpg', '.png', '.jpeg')) and f not in done])
+    print(f"{len(done)} already labeled, {len(image_files)} to go.")
+
+    cv2.namedWindow("Image")
+    cv2.setMouseCallback("Image", mouse_callback)
+
+    counter = 0
+    for fname in image_files:
+        current_filename = fname
+        current_points = []
+
+        img = cv2.imread(os.path.join(faces_dir, fname))
+        clone = img.copy()
+
+        print(f"\nLadnmarks for: {fname}")
+        print(f"Click on {len(TARGET_POINTS)} 5 points in order: {', '.join(TARGET_POINTS)}")
+
+        while True:
+            display = draw_landmarks(clone.copy(), current_points)
+            cv2.imshow("Image", display)
+            key = cv2.waitKey(10) & 0xFF
+
+            if key == 13 and len(current_points) == len(TARGET_POINTS):  # Enter
+                counter += 1
+                append_annotation(log_path, fname, current_points)
+                print(f"Landmarks saved. Counter: {counter}. Go to the next image.")
+                break
+            elif key == ord('r'):
+                current_points = []
+                print("Reset landmarks.")
+            elif key == 27 or key == ord('q'):  # Esc or q
+                print(f"Exit. Progress is in {log_path}; run 'compact' to update {json_path}.")
+                cv2.destroyAllWindows()
+                return
+
+    cv2.destroyAllWindows()
+    print(f"All images labeled. Run 'compact' to update {json_path}.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Click-to-label facial landmarks.")
+    parser.add_argument("command", nargs="?", default="label", choices=["label", "compact"],
+                        help="label images (default) or compact the log into JSON + NPZ")
+    parser.add_argument("--faces-dir", default=FACES_DIR)
+    parser.add_argument("--log", default=LOG_FILE, help="Append-only annotation log")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Compacted JSON annotations")
+    parser.add_argument("--npz", default=NPZ_FILE, help="Compacted binary annotations")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "compact":
+        compact(args.log, args.output, args.npz)
+    else:
+        label(args.faces_dir, args.log, args.output)
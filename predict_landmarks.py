@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 from landmark_model import LandmarkCNN
 from torchvision import transforms
-from face import detect_faces_haar
+from face_detection import detect_faces_haar
 
 MODEL_PATH = "landmark_model.pt"
 IMAGE_PATH = "test_photos/Ira.jpg"
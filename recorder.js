@@ -7,14 +7,64 @@ const spinner = document.getElementById("uploadSpinner");
 let mediaRecorder;
 let recordedChunks = [];
 
+// Process-while-recording: chunks are posted to a backend session as they are
+// recorded, so only the tail is left to process after Stop.
+const CHUNK_MS = 1000; // MediaRecorder timeslice
+let sessionId = null;
+let chunkSeq = 0;
+let chunkUploads = Promise.resolve(); // keeps chunk uploads in order
+
 const BACKEND_URL = "http://localhost:5000"; // Flask backend URL
 
 startButton.addEventListener("click", () => {
   recStart.disabled = false;
 });
 
+function startSession() {
+  const formData = new FormData();
+  formData.append("mask", window.currentMaskType || "cat");
+  return fetch(`${BACKEND_URL}/sessions`, { method: "POST", body: formData })
+    .then((res) => (res.ok ? res.json() : null))
+    .then((data) => (data ? data.session_id : null))
+    .catch(() => null);
+}
+
+function uploadChunk(blob) {
+  const seq = chunkSeq++;
+  chunkUploads = chunkUploads.then(() => {
+    if (!sessionId) return;
+    const formData = new FormData();
+    formData.append("chunk", blob, `chunk${seq}.webm`);
+    formData.append("seq", seq);
+    return fetch(`${BACKEND_URL}/sessions/${sessionId}/chunks`, {
+      method: "POST",
+      body: formData,
+    })
+      .then((res) => {
+        if (!res.ok) {
+          // Session broke; fall back to uploading the whole recording on Stop.
+          sessionId = null;
+        }
+      })
+      .catch(() => {
+        // Network error: same fallback, and keep the chain alive for later chunks
+        sessionId = null;
+      });
+  });
+}
+
 recStart.addEventListener("click", () => {
   recordedChunks = [];
+  chunkSeq = 0;
+  sessionId = null;
+  chunkUploads = startSession()
+    .then((id) => {
+      sessionId = id;
+    })
+    .catch(() => {
+      sessionId = null;
+    });
+
   mediaRecorder = new MediaRecorder(recordVideoEl.srcObject, {
     mimeType: "video/webm;codecs=vp8",
   });
@@ -22,10 +72,11 @@ recStart.addEventListener("click", () => {
   mediaRecorder.ondataavailable = (e) => {
     if (e.data.size > 0) {
       recordedChunks.push(e.data);
+      uploadChunk(e.data);
     }
   };
 
-  mediaRecorder.start();
+  mediaRecorder.start(CHUNK_MS);
   recStart.disabled = true;
   recStop.disabled = false;
   spinner.classList.add("hidden");
@@ -38,8 +89,37 @@ recStop.addEventListener("click", () => {
   spinner.classList.remove("hidden");
 });
 
-// After recording stops, upload the video
+function showProcessed(blobResp) {
+  const mp4Blob = new Blob([blobResp], { type: "video/mp4" });
+  const url = URL.createObjectURL(mp4Blob);
+  recordVideoEl.srcObject = null;
+  recordVideoEl.src = url;
+  recordVideoEl.load();
+  recordVideoEl.play();
+  spinner.classList.add("hidden");
+}
+
+// After recording stops, finish the session (or upload the whole video)
 function uploadRecording() {
+  chunkUploads
+    .then(() => {
+      if (!sessionId) return uploadWholeRecording();
+      return fetch(`${BACKEND_URL}/sessions/${sessionId}/finish`, { method: "POST" })
+        // A network error on finish falls back too; a failing fallback is not retried
+        .then(
+          (res) => (res.ok ? res.blob() : uploadWholeRecording()),
+          () => uploadWholeRecording()
+        );
+    })
+    .then(showProcessed)
+    .catch((err) => {
+      console.error(err);
+      alert("Upload failed");
+      spinner.classList.add("hidden");
+    });
+}
+
+function uploadWholeRecording() {
   const blob = new Blob(recordedChunks, { type: "video/webm" });
   const formData = new FormData();
   formData.append("video", blob, "recording.webm");
@@ -47,34 +127,19 @@ function uploadRecording() {
     formData.append("mask", window.currentMaskType);
   }
 
-  fetch(`${BACKEND_URL}/process-inline`, {
+  return fetch(`${BACKEND_URL}/process-inline`, {
     method: "POST",
     body: formData,
-  })
-    .then((res) => {
-      if (!res.ok) {
-        throw new Error("Processing failed");
-      }
-      return res.blob();
-    })
-    .then((blobResp) => {
-      const mp4Blob = new Blob([blobResp], { type: "video/mp4" });
-      const url = URL.createObjectURL(mp4Blob);
-      recordVideoEl.srcObject = null;
-      recordVideoEl.src = url;
-      recordVideoEl.load();
-      recordVideoEl.play();
-      spinner.classList.add("hidden");
-    })
-    .catch((err) => {
-      console.error(err);
-      alert("Upload failed");
-      spinner.classList.add("hidden");
-    });
+  }).then((res) => {
+    if (!res.ok) {
+      throw new Error("Processing failed");
+    }
+    return res.blob();
+  });
 }
 
 if (typeof MediaRecorder !== "undefined") {
   recStop.addEventListener("click", () => {
     mediaRecorder.onstop = uploadRecording;
   });
-} 
\ No newline at end of file
+}
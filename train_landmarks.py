@@ -1,11 +1,20 @@
-import os
+import argparse
 import json
+import os
+import random
+import socket
+import time
 import cv2
 import numpy as np
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.utils.data import Dataset, DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from torchvision import transforms
 from landmark_model import LandmarkCNN
+from annotation_store import load_arrays
 import torch.nn as nn
 import torch.optim as optim
 
@@ -17,10 +26,8 @@ class LandmarkDataset(Dataset):
             transforms.ToTensor(),
         ])
 
-        with open(json_path, 'r') as f:
-            self.annotations = json.load(f)
-
-        self.image_files = list(self.annotations.keys())
+        # json_path may be landmarks.json, the labeling log, or the compacted .npz
+        self.image_files, self.points = load_arrays(json_path)
 
     def __len__(self):
         return len(self.image_files)
@@ -32,43 +39,212 @@ class LandmarkDataset(Dataset):
         image = cv2.resize(image, (self.image_size, self.image_size))
         image = self.transform(image)
 
-        points = np.array(self.annotations[fname], dtype=np.float32)
+        points = np.array(self.points[idx], dtype=np.float32)
         points[:, 0] = points[:, 0] * (self.image_size / image.shape[2])
         points[:, 1] = points[:, 1] * (self.image_size / image.shape[1])
         points = points.flatten() / self.image_size  # Normalize to [0,1].
 
         return image, torch.tensor(points)
 
-def train():
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    dataset = LandmarkDataset("detected_faces", "landmarks.json")
-    dataloader = DataLoader(dataset, batch_size=16, shuffle=True)
+BASE_BATCH_SIZE = 16
+BASE_LR = 0.001
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bf16 math (AVX512-BF16 or AMX); emulated bf16 is slower than fp32."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def free_port():
+    """A TCP port nothing is listening on, for the DDP rendezvous."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
 
-    model = LandmarkCNN().to(device)
+def train(image_dir="detected_faces", annotations="landmarks.json", epochs=100,
+          batch_size=BASE_BATCH_SIZE, lr=None, channels_last=False, bf16=False, compile_model=False,
+          num_workers=0, model_name="landmark_model.pt", nproc=1, seed=None, stats_path=None, max_steps=None):
+    """Train LandmarkCNN.
+
+    lr defaults to BASE_LR scaled linearly with batch_size / BASE_BATCH_SIZE.
+    channels_last, bf16 (CPU autocast, only if the CPU supports it) and
+    compile_model (torch.compile) are opt-in throughput settings. The loss is
+    accumulated on the device and read back once per epoch, not every step.
+
+    nproc > 1 trains with DistributedDataParallel (gloo) over that many local
+    processes. batch_size stays the global batch and must divide evenly
+    across ranks, so the LR and results are comparable with single-process
+    runs. seed makes runs reproducible for a given nproc. If stats_path is
+    set, rank 0 writes the per-epoch timings there as JSON. max_steps caps
+    the batches per epoch (for smoke runs).
+    """
+    config = dict(image_dir=image_dir, annotations=annotations, epochs=epochs, batch_size=batch_size,
+                  lr=lr, channels_last=channels_last, bf16=bf16, compile_model=compile_model,
+                  num_workers=num_workers, model_name=model_name, seed=seed, stats_path=stats_path,
+                  max_steps=max_steps)
+    if batch_size % nproc:
+        raise ValueError(f"batch_size {batch_size} is not divisible by nproc {nproc}")
+    if nproc > 1:
+        os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+        # A fixed port collides with another run on the same host; an explicit MASTER_PORT still wins.
+        # Passed in config rather than os.environ so each call in one process gets a fresh port.
+        config["master_port"] = os.environ.get("MASTER_PORT") or str(free_port())
+        mp.spawn(_train_worker, args=(nproc, config), nprocs=nproc, join=True)
+    else:
+        _train_worker(0, 1, config)
+
+
+def _train_worker(rank, world_size, config):
+    distributed = world_size > 1
+    if distributed:
+        os.environ["MASTER_PORT"] = config["master_port"]
+        dist.init_process_group("gloo", rank=rank, world_size=world_size)
+        # Split the cores between ranks instead of each grabbing all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    is_main = rank == 0
+    seed = config["seed"]
+    if seed is not None:
+        seed_everything(seed)
+
+    device = torch.device("cuda" if torch.cuda.is_available() and not distributed else "cpu")
+    dataset = LandmarkDataset(config["image_dir"], config["annotations"])
+    batch_size = config["batch_size"]
+    per_rank_batch = batch_size // world_size  # train() checked it divides evenly
+    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True,
+                                 seed=seed or 0) if distributed else None
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    num_workers = config["num_workers"]
+    dataloader = DataLoader(dataset, batch_size=per_rank_batch, shuffle=sampler is None,
+                            sampler=sampler, generator=generator, num_workers=num_workers,
+                            persistent_workers=num_workers > 0)
+
+    lr = config["lr"]
+    if lr is None:
+        lr = BASE_LR * batch_size / BASE_BATCH_SIZE
+    bf16 = config["bf16"]
+    if bf16 and device.type == "cpu" and not cpu_supports_bf16():
+        if is_main:
+            print("[WARN] CPU has no native bf16 support, training in fp32")
+        bf16 = False
+    channels_last = config["channels_last"]
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
+    model = LandmarkCNN().to(device, memory_format=memory_format)
     criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+
+    # DDP broadcasts rank 0's weights at construction and all-reduces gradients in backward()
+    train_model = DDP(model) if distributed else model
+    if config["compile_model"]:
+        # torch.compile is lazy, so compile now with one dummy step: a missing
+        # toolchain then falls back to eager instead of failing mid-epoch
+        state = {k: v.clone() for k, v in model.state_dict().items()}
+        try:
+            compiled = torch.compile(train_model)
+            warmup = torch.zeros(per_rank_batch, 1, dataset.image_size, dataset.image_size, device=device)
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+                out = compiled(warmup.to(memory_format=memory_format))
+            out.float().sum().backward()
+            train_model = compiled
+        except Exception as e:  # older torch / missing compiler toolchain
+            if is_main:
+                print(f"[WARN] torch.compile unavailable ({e}), running eagerly")
+        finally:
+            model.load_state_dict(state)  # undo the dummy step's BatchNorm statistics
+            optimizer.zero_grad(set_to_none=True)
 
-    epochs = 100
-    model_name = "landmark_model.pt"
-    
+    epochs = config["epochs"]
+    if is_main:
+        print(f"batch_size={batch_size} ({per_rank_batch}/rank x {world_size}) lr={lr:g} "
+              f"channels_last={channels_last} bf16={bf16} compile={config['compile_model']} "
+              f"workers={num_workers} seed={seed}")
+
+    epoch_stats = []
     for epoch in range(epochs):
-        running_loss = 0.0
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        epoch_start = time.perf_counter()
+        running_loss = torch.zeros((), device=device)
+        samples = steps = 0
         for images, targets in dataloader:
-            images = images.to(device)
+            if config["max_steps"] is not None and steps >= config["max_steps"]:
+                break
+            images = images.to(device, memory_format=memory_format)
             targets = targets.to(device)
 
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, targets)
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=bf16):
+                outputs = train_model(images)
+            loss = criterion(outputs.float(), targets)
             loss.backward()
             optimizer.step()
 
-            running_loss += loss.item()
+            running_loss += loss.detach()
+            samples += images.size(0)
+            steps += 1
+
+        # One sync per epoch: mean loss and total samples across ranks
+        totals = torch.stack([running_loss / max(1, steps),
+                              torch.tensor(float(samples), device=device)])
+        if distributed:
+            dist.all_reduce(totals)
+            totals[0] /= world_size
+        epoch_time = time.perf_counter() - epoch_start
+        mean_loss, total_samples = totals.tolist()
+        epoch_stats.append({"epoch": epoch + 1, "loss": mean_loss, "seconds": epoch_time,
+                            "samples_per_sec": total_samples / epoch_time})
+        if is_main:
+            print(f"Epoch {epoch+1}/{epochs}, Loss: {mean_loss:.4f}, "
+                  f"{epoch_time:.2f}s, {total_samples / epoch_time:.1f} samples/sec")
 
-        print(f"Epoch {epoch+1}/{epochs}, Loss: {running_loss/len(dataloader):.4f}")
+    if is_main:
+        torch.save(model.state_dict(), config["model_name"])
+        print(f"Model saved like {config['model_name']}")
+        if config["stats_path"]:
+            with open(config["stats_path"], "w") as f:
+                json.dump({"world_size": world_size, "batch_size": batch_size, "epochs": epoch_stats}, f)
+    if distributed:
+        dist.destroy_process_group()
 
-    torch.save(model.state_dict(), model_name)
-    print(f"Model saved like {model_name}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the landmark CNN.")
+    parser.add_argument("--images", default="detected_faces")
+    parser.add_argument("--annotations", default="landmarks.json", help="landmarks.json/.jsonl/.npz")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"Default {BASE_BATCH_SIZE}, or 64 with --perf")
+    parser.add_argument("--lr", type=float, default=None, help="Default: linearly scaled with batch size")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--bf16", action="store_true", help="bf16 autocast (CPUs with AVX512-BF16/AMX)")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model")
+    parser.add_argument("--perf", action="store_true",
+                        help="Throughput mode: channels_last + bf16 + compile, batch 64, 2 loader workers")
+    parser.add_argument("--nproc", type=int, default=1,
+                        help="Local processes for DistributedDataParallel (gloo) training")
+    parser.add_argument("--seed", type=int, default=None, help="Fix for reproducible runs")
+    parser.add_argument("--output", default="landmark_model.pt")
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    train()
+    args = parse_args()
+    if args.perf:
+        args.channels_last = args.bf16 = args.compile = True
+        args.batch_size = args.batch_size or 64
+        args.workers = args.workers or 2
+    train(args.images, args.annotations, epochs=args.epochs,
+          batch_size=args.batch_size or BASE_BATCH_SIZE, lr=args.lr,
+          channels_last=args.channels_last, bf16=args.bf16, compile_model=args.compile,
+          num_workers=args.workers, model_name=args.output, nproc=args.nproc, seed=args.seed)
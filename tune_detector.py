@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from annotation_store import load_annotations
+from face_detection import PROFILES_FILE, detect_faces_haar
+
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+# ---------------------- SWEEP GRID ---------------------- #
+SCALE_FACTORS = [1.02, 1.05, 1.1, 1.15, 1.2, 1.3]
+MIN_NEIGHBORS = [3, 4, 5, 6]
+MIN_SIZE_RATIOS = [0.0, 0.05, 0.1, 0.15, 0.2, 0.3]  # 0.0 = just the 40px floor
+
+# How much recall each profile may give up relative to the best setting found
+PROFILE_RECALL_SLACK = {"accurate": 0.0, "balanced": 0.02, "fast": 0.10}
+
+
+# ========== Data ==========
+def load_labeled_set(annotations, images_dir):
+    """[(gray_image, landmarks (5, 2) or None)] for every annotated image found on disk."""
+    if annotations.endswith('.txt'):
+        from evaluate import parse_celeba_landmarks
+        gts = parse_celeba_landmarks(annotations, images_dir)
+    else:
+        gts = load_annotations(annotations)
+    samples = []
+    for fname, points in sorted(gts.items()):
+        img = cv2.imread(os.path.join(images_dir, fname), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            samples.append((img, np.asarray(points, dtype=np.float32).reshape(-1, 2)))
+    return samples
+
+def load_unlabeled_set(images_dir):
+    """Photos known to contain one main face but with no landmarks (e.g. test_photos)."""
+    samples = []
+    for fname in sorted(os.listdir(images_dir)):
+        if fname.lower().endswith(IMAGE_EXTS):
+            img = cv2.imread(os.path.join(images_dir, fname), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                samples.append((img, None))
+    return samples
+
+
+# ========== Scoring ==========
+def box_contains(box, points):
+    x, y, w, h = box
+    return bool(np.all((points[:, 0] >= x) & (points[:, 0] <= x + w) &
+                       (points[:, 1] >= y) & (points[:, 1] <= y + h)))
+
+def score_params(samples, cascade, params):
+    """Recall, false positives per image and ms/frame for one parameter set.
+
+    With landmarks, a face counts as found if a box contains both eyes and the
+    nose, and every other box is a false positive. Without landmarks, any
+    detection counts as a hit and extra boxes count as false positives.
+    """
+    hits = 0
+    false_positives = 0
+    elapsed = 0.0
+    for img, points in samples:
+        start = time.perf_counter()
+        boxes = detect_faces_haar(img, cascade, **params)
+        elapsed += time.perf_counter() - start
+
+        if points is None:
+            found = len(boxes) > 0
+            false_positives += max(0, len(boxes) - 1)
+        else:
+            matching = [b for b in boxes if box_contains(b, points[:3])]
+            found = len(matching) > 0
+            false_positives += len(boxes) - min(1, len(matching))
+        hits += found
+
+    n = max(1, len(samples))
+    return {
+        "recall": hits / n,
+        "fp_per_image": false_positives / n,
+        "ms_per_frame": elapsed / n * 1000,
+    }
+
+def pareto_front(results):
+    """Results not dominated on (higher recall, fewer FPs, lower ms/frame)."""
+    def dominates(a, b):
+        no_worse = (a["recall"] >= b["recall"] and a["fp_per_image"] <= b["fp_per_image"]
+                    and a["ms_per_frame"] <= b["ms_per_frame"])
+        better = (a["recall"] > b["recall"] or a["fp_per_image"] < b["fp_per_image"]
+                  or a["ms_per_frame"] < b["ms_per_frame"])
+        return no_worse and better
+    return [r for r in results if not any(dominates(o, r) for o in results)]
+
+def choose_profiles(front):
+    """Pick the fastest front point within each profile's recall slack of the best recall."""
+    best_recall = max(r["recall"] for r in front)
+    profiles = {}
+    for name, slack in PROFILE_RECALL_SLACK.items():
+        ok = [r for r in front if r["recall"] >= best_recall - slack - 1e-9]
+        pick = min(ok, key=lambda r: (r["ms_per_frame"], r["fp_per_image"]))
+        profiles[name] = dict(pick["params"])
+    return profiles
+
+
+# ========== Main ==========
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep Haar cascade parameters and write detector profiles.")
+    parser.add_argument("--labeled", nargs=2, action="append", metavar=("ANNOTATIONS", "IMAGES_DIR"),
+                        help="landmarks.json/.jsonl/.npz or CelebA .txt, plus its image dir (repeatable)")
+    parser.add_argument("--unlabeled", action="append", metavar="IMAGES_DIR",
+                        help="Dir of photos with one face each, no landmarks (repeatable)")
+    parser.add_argument("--max-images", type=int, default=500, help="Cap per set, to keep sweeps quick")
+    parser.add_argument("--profiles", default=PROFILES_FILE, help="Profiles JSON to write")
+    parser.add_argument("--report", default="detector_sweep.json", help="Full sweep results")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, do not write profiles")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.labeled and not args.unlabeled:
+        args.labeled = [["landmarks.json", "detected_faces"]] if os.path.isdir("detected_faces") else []
+        args.unlabeled = ["test_photos"]
+
+    samples = []
+    for annotations, images_dir in args.labeled or []:
+        samples += load_labeled_set(annotations, images_dir)[:args.max_images]
+    for images_dir in args.unlabeled or []:
+        samples += load_unlabeled_set(images_dir)[:args.max_images]
+    if not samples:
+        raise SystemExit("No images found to tune on.")
+    print(f"Tuning on {len(samples)} images.")
+
+    cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    results = []
+    for scale_factor, min_neighbors, ratio in itertools.product(SCALE_FACTORS, MIN_NEIGHBORS, MIN_SIZE_RATIOS):
+        params = {"scale_factor": scale_factor, "min_neighbors": min_neighbors,
+                  "min_size": 40, "min_size_ratio": ratio}
+        result = score_params(samples, cascade, params)
+        result["params"] = params
+        results.append(result)
+        print(f"scale={scale_factor:<5} neighbors={min_neighbors} min_ratio={ratio:<5} "
+              f"recall={result['recall']:.3f} fp/img={result['fp_per_image']:.3f} "
+              f"{result['ms_per_frame']:.1f} ms/frame")
+
+    front = sorted(pareto_front(results), key=lambda r: r["ms_per_frame"])
+    print("\nPareto front (recall / fp per image / ms per frame):")
+    for r in front:
+        print(f"  {r['recall']:.3f}  {r['fp_per_image']:.3f}  {r['ms_per_frame']:7.1f}  {r['params']}")
+
+    profiles = choose_profiles(front)
+    with open(args.report, 'w') as f:
+        json.dump({"images": len(samples), "results": results, "pareto_front": front,
+                   "profiles": profiles}, f, indent=2)
+    print(f"\nSweep written to {args.report}")
+
+    if not args.dry_run:
+        with open(args.profiles, 'w') as f:
+            json.dump({"profiles": profiles, "source": f"tune_detector.py on {len(samples)} images"},
+                      f, indent=4)
+        print(f"Profiles written to {args.profiles}: {', '.join(profiles)}")